@@ -0,0 +1,372 @@
+# Runs a jupytext py:percent notebook (like sonoma_shelter.py) top to bottom, but
+# only re-executes the cells whose source or upstream inputs changed.
+#
+# Each code cell is parsed to find the top-level names it reads and writes. A cell's
+# key hashes its source together with the keys of the cells that produced the names
+# it reads, so editing one cell changes its key and the keys of everything
+# downstream of it, and nothing else. After a cell runs, the names it wrote are
+# pickled under its key when the cell took at least min_seconds (the CSV load, the
+# breed/age derivations). On the next run:
+#   - cells with an unchanged key are skipped,
+#   - cells with a new key run, loading their inputs from the producers' snapshots,
+#   - an unchanged producer whose outputs weren't saved (modules, functions, cheap
+#     cells) runs again when a re-run cell needs its names.
+# Snapshots of keys no cell has any more are deleted after each run.
+#
+# Writes are found from assignments, imports, def/class, `x[...] = ...`,
+# `x.attr = ...`, `del x` and calls with inplace=True. Other in-place method calls
+# are not seen, so a cell relying on them should also assign the name.
+#   python cell_cache.py sonoma_shelter.py
+#   python cell_cache.py sonoma_shelter.py --dry-run
+
+import ast
+import builtins
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
+
+from shelter_profiling import stage
+
+CACHE_DIR = '.cell_cache'
+CELL_MARKER = re.compile(r'^# %%(.*)$')
+BUILTINS = set(dir(builtins))
+
+
+class Cell:
+    def __init__(self, index, header, source):
+        self.index = index
+        self.header = header
+        self.source = source
+        self.reads, self.writes = cell_names(source)
+        self.key = None
+
+
+# code cells of a py:percent file, markdown cells and the jupytext header dropped
+def parse_cells(path):
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    cells = []
+    header, body = None, []
+
+    def flush():
+        if header is not None and '[markdown]' not in header and '[md]' not in header:
+            source = '\n'.join(body).strip('\n')
+            if source.strip():
+                cells.append(Cell(len(cells), header.strip(), source))
+
+    for line in lines:
+        match = CELL_MARKER.match(line)
+        if match:
+            flush()
+            header, body = match.group(1), []
+        else:
+            body.append(line)
+    flush()
+    return cells
+
+
+# IPython magics and shell escapes can't be parsed or exec'd as python
+def python_source(source):
+    return '\n'.join('' if line.lstrip().startswith(('%', '!')) else line for line in source.splitlines())
+
+
+def _target_names(target):
+    if isinstance(target, ast.Name):
+        return {target.id}
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return set().union(*(_target_names(element) for element in target.elts))
+    if isinstance(target, ast.Starred):
+        return _target_names(target.value)
+    # x[...] = ..., x.attr = ... write to x
+    if isinstance(target, (ast.Subscript, ast.Attribute)):
+        return _target_names(target.value)
+    return set()
+
+
+# names bound inside lambdas and comprehensions, which don't leak to module level
+def _nested_bound(node):
+    bound = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Lambda):
+            bound |= {a.arg for a in ast.walk(child.args) if isinstance(a, ast.arg)}
+        elif isinstance(child, ast.comprehension):
+            bound |= _target_names(child.target)
+    return bound
+
+
+def _loads(node):
+    loads = {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+    return loads - _nested_bound(node)
+
+
+# free names of a function or class body: everything loaded that isn't an argument
+# or bound inside it
+def _free_loads(node):
+    bound = {a.arg for a in ast.walk(node) if isinstance(a, ast.arg)}
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and isinstance(child.ctx, (ast.Store, ast.Del)):
+            bound.add(child.id)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and child is not node:
+            bound.add(child.name)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            bound |= {(alias.asname or alias.name).split('.')[0] for alias in child.names}
+    loads = {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+    return loads - bound
+
+
+def _simple_writes(node):
+    writes = set()
+    if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        for target in targets:
+            writes |= _target_names(target)
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+        writes |= {(alias.asname or alias.name).split('.')[0] for alias in node.names}
+    elif isinstance(node, ast.Delete):
+        for target in node.targets:
+            writes |= _target_names(target)
+    for child in ast.walk(node):
+        if isinstance(child, ast.NamedExpr):
+            writes.add(child.target.id)
+        elif isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute):
+            if any(k.arg == 'inplace' for k in child.keywords):
+                writes |= _target_names(child.func.value)
+    return writes
+
+
+class _Scan:
+    def __init__(self):
+        self.defined, self.reads, self.writes, self.deferred = set(), set(), set(), set()
+
+    def read(self, node):
+        if node is not None:
+            self.reads |= _loads(node) - self.defined
+
+    def bind(self, names):
+        self.defined |= names
+        self.writes |= names
+
+    def statements(self, nodes):
+        for node in nodes:
+            self.statement(node)
+
+    def statement(self, node):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # bodies run later, by which time the whole cell has run
+            self.deferred |= _free_loads(node)
+            for decorator in node.decorator_list:
+                self.read(decorator)
+            if not isinstance(node, ast.ClassDef):
+                for default in node.args.defaults + node.args.kw_defaults:
+                    self.read(default)
+            self.bind({node.name})
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            self.read(node.iter)
+            self.bind(_target_names(node.target))
+            self.statements(node.body + node.orelse)
+        elif isinstance(node, ast.While):
+            self.read(node.test)
+            self.statements(node.body + node.orelse)
+        elif isinstance(node, ast.If):
+            self.read(node.test)
+            self.statements(node.body + node.orelse)
+        elif isinstance(node, (ast.With, ast.AsyncWith)):
+            for item in node.items:
+                self.read(item.context_expr)
+                if item.optional_vars is not None:
+                    self.bind(_target_names(item.optional_vars))
+            self.statements(node.body)
+        elif isinstance(node, ast.Try):
+            self.statements(node.body)
+            for handler in node.handlers:
+                self.read(handler.type)
+                if handler.name:
+                    self.bind({handler.name})
+                self.statements(handler.body)
+            self.statements(node.orelse + node.finalbody)
+        else:
+            self.read(node)
+            # x[...] = ... and x.attr = ... need x to exist already
+            targets = getattr(node, 'targets', None) or [getattr(node, 'target', None)]
+            for target in targets:
+                if isinstance(target, (ast.Subscript, ast.Attribute)):
+                    self.reads |= _target_names(target) - self.defined
+            self.bind(_simple_writes(node))
+
+
+# names a cell reads from earlier cells, and names it (re)binds or mutates
+def cell_names(source):
+    scan = _Scan()
+    scan.statements(ast.parse(python_source(source)).body)
+    reads = scan.reads | (scan.deferred - scan.defined)
+    return reads - BUILTINS, scan.writes
+
+
+# keys chain each cell's source to the keys of the cells that produced its inputs
+def assign_keys(cells):
+    producer = {}
+    for cell in cells:
+        digest = hashlib.sha1(cell.source.encode())
+        cell.inputs = {}
+        for name in sorted(cell.reads):
+            if name in producer:
+                cell.inputs[name] = producer[name]
+                digest.update(('%s=%s' % (name, producer[name].key)).encode())
+        cell.key = digest.hexdigest()[:16]
+        for name in cell.writes:
+            producer[name] = cell
+
+
+class CellCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def has(self, key):
+        return key in self.index
+
+    def saved_names(self, key):
+        return set(self.index.get(key, {}).get('saved', []))
+
+    def load(self, key, name):
+        with open(os.path.join(self.cache_dir, key + '.pkl'), 'rb') as f:
+            return pickle.load(f)[name]
+
+    # pickles the picklable names; the rest are recorded so the cell re-runs when needed
+    def store(self, key, namespace, names, snapshot):
+        saved, values = [], {}
+        if snapshot:
+            for name in sorted(names):
+                if name not in namespace:
+                    continue
+                try:
+                    pickle.dumps(namespace[name])
+                except Exception:
+                    continue
+                values[name] = namespace[name]
+                saved.append(name)
+        if values:
+            with open(os.path.join(self.cache_dir, key + '.pkl'), 'wb') as f:
+                pickle.dump(values, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.index[key] = {'saved': saved}
+
+    def save_index(self):
+        with open(self.index_path, 'w') as f:
+            json.dump(self.index, f)
+
+    # drops the entries and snapshots of keys no cell has any more
+    def prune(self, keys):
+        for key in set(self.index) - set(keys):
+            del self.index[key]
+            path = os.path.join(self.cache_dir, key + '.pkl')
+            if os.path.exists(path):
+                os.remove(path)
+        self.save_index()
+
+
+# cells that have to run: new keys, plus unchanged producers whose unsaved outputs a
+# running cell needs
+def plan(cells, cache, force=False):
+    run = {cell.index for cell in cells if force or not cache.has(cell.key)}
+    changed = True
+    while changed:
+        changed = False
+        for cell in cells:
+            if cell.index not in run:
+                continue
+            for name, producer in cell.inputs.items():
+                if producer.index not in run and name not in cache.saved_names(producer.key):
+                    run.add(producer.index)
+                    changed = True
+    return run
+
+
+def run_notebook(path, cache_dir=None, min_seconds=0.5, force=False, dry_run=False, verbose=True):
+    cells = parse_cells(path)
+    assign_keys(cells)
+    if cache_dir is None:
+        cache_dir = os.path.join(CACHE_DIR, os.path.splitext(os.path.basename(path))[0])
+    cache = CellCache(cache_dir)
+    to_run = plan(cells, cache, force)
+
+    namespace = {'__name__': '__main__', '__file__': os.path.abspath(path)}
+    # cell that last bound each name in namespace: a producer re-run for its unsaved
+    # outputs may rebind names a later cached cell changed, and those come from the
+    # later cell's snapshot
+    bound_by = {}
+    report = []
+    for cell in cells:
+        label = 'cell %d %s' % (cell.index, cell.header)
+        if cell.index not in to_run:
+            report.append((cell.index, 'cached', 0.0))
+            continue
+        if dry_run:
+            report.append((cell.index, 'would run', 0.0))
+            continue
+        for name, producer in cell.inputs.items():
+            if producer.index not in to_run and bound_by.get(name) != producer.index:
+                namespace[name] = cache.load(producer.key, name)
+                bound_by[name] = producer.index
+        start = time.perf_counter()
+        with stage(label.strip(), 'cell'):
+            exec(compile(python_source(cell.source), '%s [cell %d]' % (path, cell.index), 'exec'), namespace)
+        elapsed = time.perf_counter() - start
+        bound_by.update(dict.fromkeys(cell.writes, cell.index))
+        cache.store(cell.key, namespace, cell.writes, snapshot=elapsed >= min_seconds)
+        cache.save_index()
+        report.append((cell.index, 'ran', elapsed))
+    if not dry_run:
+        cache.prune(cell.key for cell in cells)
+
+    if verbose:
+        for index, status, elapsed in report:
+            first_line = cells[index].source.splitlines()[0][:60]
+            print('%3d  %-9s %7.3f s  %s' % (index, status, elapsed, first_line))
+    return namespace, report
+
+
+# re-runs the notebook whenever the file is saved; imports stay loaded between runs
+# so a plot edit only costs the plot cell
+def watch(path, interval=0.5, **kwargs):
+    last = None
+    while True:
+        mtime = os.path.getmtime(path)
+        if mtime != last:
+            last = mtime
+            try:
+                run_notebook(path, **kwargs)
+            except Exception as e:
+                print('error: %r' % (e,))
+            print('watching %s for changes...' % path)
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a py:percent notebook, re-running only changed cells')
+    parser.add_argument('path')
+    parser.add_argument('--cache-dir', help='defaults to .cell_cache/<notebook name>')
+    parser.add_argument('--min-seconds', type=float, default=0.5,
+                        help='snapshot the outputs of cells that take at least this long')
+    parser.add_argument('--force', action='store_true', help='run every cell')
+    parser.add_argument('--dry-run', action='store_true', help='only show which cells would run')
+    parser.add_argument('--watch', action='store_true', help='keep running and re-run on every save')
+    args = parser.parse_args()
+
+    # plots are rendered off screen so plt.show() doesn't block
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    if args.watch:
+        watch(args.path, cache_dir=args.cache_dir, min_seconds=args.min_seconds)
+    else:
+        run_notebook(args.path, args.cache_dir, args.min_seconds, args.force, args.dry_run)
@@ -0,0 +1,165 @@
+# Ranks every candidate factor from Question.MD against `Days in Shelter` and
+# `Outcome Type` in one pass.
+#
+#   stay vs categorical factor    Kruskal-Wallis H, eta squared (rank based)
+#   stay vs age                   Spearman rho
+#   outcome vs categorical factor chi square, Cramer's V (sparse one-hot crosstab)
+#   outcome vs age                Kruskal-Wallis H over the outcome groups
+#
+# Rows are ranked by effect_r, every effect size on one correlation scale: |rho|,
+# eta (the square root of eta squared) and Cramer's V. eta squared is a share of
+# variance, so sorting it next to |rho| or V would rank by mixed scales.
+#
+# Stays are ranked once and every grouped statistic comes from bincount over the
+# factor codes, so each factor costs a few O(n) passes. Factors run in a thread pool
+# (the numpy calls release the GIL).
+#   table = rank_associations(df)
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+
+from shelter_pipeline import get_primary_breed, get_primary_color, map_distinct
+from shelter_profiling import profiled
+from shelter_validation import parse_dates
+
+STAY_COLUMN = 'Days in Shelter'
+OUTCOME_COLUMN = 'Outcome Type'
+
+
+# candidate factors as (kind, values): 'category' values are any hashable labels,
+# 'numeric' values are floats with NaN for missing
+def candidate_factors(df, current_date=None):
+    if current_date is None:
+        current_date = datetime.today()
+    intake = parse_dates(df['Intake Date'])
+    dob = parse_dates(df['Date Of Birth'])
+
+    return {
+        'Type': ('category', df['Type']),
+        'PrimaryBreed': ('category', map_distinct(df['Breed'], get_primary_breed)),
+        'Age': ('numeric', ((pd.Timestamp(current_date) - dob).dt.days / 365).to_numpy(dtype=float)),
+        'Size': ('category', df['Size']),
+        'Sex': ('category', df['Sex']),
+        'Outcome Type': ('category', df['Outcome Type']),
+        'Intake Condition': ('category', df['Intake Condition']),
+        'Intake Type': ('category', df['Intake Type']),
+        'Primary Color': ('category', map_distinct(df['Color'], get_primary_color)),
+        'Intake Month': ('category', intake.dt.month),
+    }
+
+
+# integer codes 0..k-1 with missing values as their own level
+def category_codes(values):
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    return codes, len(uniques)
+
+
+def tie_correction(ranks_sorted_counts, n):
+    return 1 - (ranks_sorted_counts ** 3 - ranks_sorted_counts).sum() / (n ** 3 - n)
+
+
+# Kruskal-Wallis H from precomputed ranks: rank sums per group by bincount
+def grouped_kruskal(ranks, codes, k, correction):
+    n = len(ranks)
+    sizes = np.bincount(codes, minlength=k)
+    rank_sums = np.bincount(codes, weights=ranks, minlength=k)
+    present = sizes > 0
+    k_present = int(present.sum())
+    h = 12.0 / (n * (n + 1)) * (rank_sums[present] ** 2 / sizes[present]).sum() - 3 * (n + 1)
+    h = h / correction if correction > 0 else np.nan
+    p = stats.chi2.sf(h, k_present - 1) if k_present > 1 else np.nan
+    eta2 = (h - k_present + 1) / (n - k_present) if n > k_present else np.nan
+    return h, p, max(eta2, 0.0), k_present
+
+
+# chi square and Cramer's V from a sparse one-hot crosstab
+def cramers_v(codes_a, k_a, codes_b, k_b):
+    n = len(codes_a)
+    ones = np.ones(n)
+    rows = np.arange(n)
+    onehot_a = sparse.csr_matrix((ones, (rows, codes_a)), shape=(n, k_a))
+    onehot_b = sparse.csr_matrix((ones, (rows, codes_b)), shape=(n, k_b))
+    table = (onehot_a.T @ onehot_b).toarray()
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    if min(table.shape) < 2:
+        return np.nan, np.nan, np.nan
+    expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / n
+    chi2 = ((table - expected) ** 2 / expected).sum()
+    dof = (table.shape[0] - 1) * (table.shape[1] - 1)
+    v = np.sqrt(chi2 / (n * (min(table.shape) - 1)))
+    return chi2, stats.chi2.sf(chi2, dof), v
+
+
+def _stay_association(name, kind, values, stay, stay_ranks, correction):
+    if kind == 'numeric':
+        keep = ~np.isnan(values)
+        # ranks of the stays within the kept rows, then Pearson on the ranks
+        rho, p = stats.spearmanr(values[keep], stay[keep])
+        return {'factor': name, 'target': STAY_COLUMN, 'test': 'spearman', 'statistic': rho,
+                'p_value': p, 'effect_size': abs(rho), 'effect_measure': '|rho|',
+                'levels': np.nan, 'n': int(keep.sum())}
+    codes, k = values
+    h, p, eta2, levels = grouped_kruskal(stay_ranks, codes, k, correction)
+    return {'factor': name, 'target': STAY_COLUMN, 'test': 'kruskal', 'statistic': h,
+            'p_value': p, 'effect_size': eta2, 'effect_measure': 'eta2', 'levels': levels,
+            'n': len(codes)}
+
+
+def _outcome_association(name, kind, values, outcome_codes, k_outcome):
+    if kind == 'numeric':
+        keep = ~np.isnan(values)
+        ranks = stats.rankdata(values[keep])
+        _, counts = np.unique(values[keep], return_counts=True)
+        h, p, eta2, levels = grouped_kruskal(ranks, outcome_codes[keep], k_outcome,
+                                             tie_correction(counts.astype(float), keep.sum()))
+        return {'factor': name, 'target': OUTCOME_COLUMN, 'test': 'kruskal', 'statistic': h,
+                'p_value': p, 'effect_size': eta2, 'effect_measure': 'eta2', 'levels': levels,
+                'n': int(keep.sum())}
+    codes, k = values
+    chi2, p, v = cramers_v(codes, k, outcome_codes, k_outcome)
+    return {'factor': name, 'target': OUTCOME_COLUMN, 'test': 'chi2', 'statistic': chi2,
+            'p_value': p, 'effect_size': v, 'effect_measure': "cramer's V", 'levels': k,
+            'n': len(codes)}
+
+
+# effect sizes on the correlation scale effect_r is sorted by
+def correlation_scale(effect_size, effect_measure):
+    return np.sqrt(effect_size) if effect_measure == 'eta2' else effect_size
+
+
+# one row per (factor, target), sorted by effect_r within each target
+@profiled('aggregate')
+def rank_associations(df, factors=None, current_date=None, workers=4):
+    if factors is None:
+        factors = candidate_factors(df, current_date)
+
+    keep = df[STAY_COLUMN].notna().to_numpy()
+    stay = df[STAY_COLUMN].to_numpy(dtype=float)[keep]
+    stay_ranks = stats.rankdata(stay)
+    _, tie_counts = np.unique(stay, return_counts=True)
+    correction = tie_correction(tie_counts.astype(float), len(stay))
+    outcome_codes, k_outcome = category_codes(df[OUTCOME_COLUMN])
+    outcome_codes = outcome_codes[keep]
+
+    jobs = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, (kind, values) in factors.items():
+            if kind == 'numeric':
+                values = np.asarray(values, dtype=float)[keep]
+            else:
+                codes, k = category_codes(values)
+                values = (codes[keep], k)
+            jobs.append(pool.submit(_stay_association, name, kind, values, stay, stay_ranks, correction))
+            if name != OUTCOME_COLUMN:
+                jobs.append(pool.submit(_outcome_association, name, kind, values, outcome_codes, k_outcome))
+        rows = [job.result() for job in jobs]
+
+    table = pd.DataFrame(rows)
+    table['effect_r'] = [correlation_scale(size, measure)
+                         for size, measure in zip(table['effect_size'], table['effect_measure'])]
+    return (table.sort_values(['target', 'effect_r'], ascending=[True, False])
+                 .reset_index(drop=True))
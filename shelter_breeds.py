@@ -0,0 +1,197 @@
+# Canonical breed names, so spelling variants and abbreviations of one breed
+# ('LABRADOR RETRIEVER', 'LABRADOR RETR', 'LABRADR RETR') count as one category.
+#
+# Each distinct raw Breed string is reduced to its primary breed (get_primary_breed),
+# normalized (upper case, punctuation dropped, long words abbreviated the way the
+# exports spell them) and looked up in a trigram inverted index of canonical names.
+# Shared trigrams are counted with np.unique over the posting lists, so a lookup
+# only touches names that share a trigram with it instead of every known name. The best
+# scoring candidate whose words line up one to one, each at most a typo apart, wins,
+# so a generic breed isn't folded into a more specific one. Distinct
+# strings are resolved most common first; one that matches nothing well enough becomes
+# a canonical name itself, so rarer variants map onto the common spelling.
+#   breeds = load_breed_map('breed_map.csv')       # empty canonicalizer if missing
+#   df['PrimaryBreed'] = breeds.canonicalize(df['Breed'])
+#   save_breed_map(breeds, 'breed_map.csv')        # later snapshots resolve only new strings
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from shelter_pipeline import get_primary_breed
+
+BREED_MAP_PATH = 'breed_map.csv'
+
+# primary breeds as the exports spell them
+KNOWN_BREEDS = [
+    'PIT BULL', 'LABRADOR RETR', 'GOLDEN RETR', 'GERM SHEPHERD', 'AUST SHEPHERD', 'AUST CATTLE DOG',
+    'BORDER COLLIE', 'CHIHUAHUA SH', 'CHIHUAHUA LH', 'POODLE MIN', 'POODLE TOY', 'POODLE STND',
+    'ROTTWEILER', 'BEAGLE', 'BOXER', 'SIBERIAN HUSKY', 'DACHSHUND', 'SHIH TZU', 'YORKSHIRE TERR',
+    'JACK RUSS TERR', 'AMER BULLDOG', 'DOBERMAN PINSCH', 'GREAT PYRENEES', 'MALTESE', 'PUG',
+    'DOMESTIC SH', 'DOMESTIC MH', 'DOMESTIC LH', 'SIAMESE', 'MANX', 'HIMALAYAN', 'PERSIAN',
+    'MAINE COON', 'RUSSIAN BLUE', 'BENGAL', 'RABBIT SH', 'RABBIT LH',
+]
+
+# spelled-out words -> the abbreviation the exports use
+ABBREVIATIONS = {
+    'RETRIEVER': 'RETR', 'GERMAN': 'GERM', 'AUSTRALIAN': 'AUST', 'AMERICAN': 'AMER',
+    'MINIATURE': 'MIN', 'MINI': 'MIN', 'STANDARD': 'STND', 'TERRIER': 'TERR', 'TER': 'TERR',
+    'RUSSELL': 'RUSS', 'PINSCHER': 'PINSCH',
+    'SHORTHAIR': 'SH', 'MEDIUMHAIR': 'MH', 'LONGHAIR': 'LH', 'PITBULL': 'PIT BULL',
+}
+
+
+# upper case, punctuation to spaces, long words abbreviated
+def normalize_breed(breed):
+    words = re.sub(r'[^A-Z0-9]+', ' ', str(breed).upper()).split()
+    words = [ABBREVIATIONS.get(word, word) for word in words if word != 'MIX']
+    return ' '.join(words)
+
+
+def trigrams(name):
+    padded = ' %s ' % name
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# words that don't tell breeds apart ('AUST CATTLE' is 'AUST CATTLE DOG')
+GENERIC_WORDS = {'DOG', 'CAT'}
+
+
+# edit distance with adjacent transpositions counting as one edit
+def edit_distance(a, b):
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+# same number of words and each word a typo of its partner at most; short words
+# (SH, LH, MIN, TOY, ...) must match exactly. A generic breed never matches a more
+# specific one ('BULLDOG' vs 'AMER BULLDOG', 'POODLE' vs 'POODLE STND').
+def words_match(name, candidate):
+    words = [word for word in name.split() if word not in GENERIC_WORDS]
+    others = [word for word in candidate.split() if word not in GENERIC_WORDS]
+    if len(words) != len(others):
+        return False
+    for word, other in zip(words, others):
+        shortest = min(len(word), len(other))
+        allowed = 0 if shortest <= 3 else 1 if shortest <= 7 else 2
+        if word != other and edit_distance(word, other) > allowed:
+            return False
+    return True
+
+
+class BreedCanonicalizer:
+    def __init__(self, known=KNOWN_BREEDS, threshold=0.7):
+        self.threshold = threshold
+        self.names = []
+        self.sizes = []
+        self.postings = {}
+        self.lookup = {}
+        # raw Breed string -> (canonical name, similarity)
+        self.mapping = {}
+        for name in known:
+            self.add_canonical(normalize_breed(name))
+
+    def add_canonical(self, name):
+        if name in self.lookup:
+            return self.lookup[name]
+        index = len(self.names)
+        grams = trigrams(name)
+        self.names.append(name)
+        self.sizes.append(len(grams))
+        self.lookup[name] = index
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(index)
+        return index
+
+    # best canonical name for a normalized breed and its Dice similarity
+    def match(self, name):
+        if name in self.lookup:
+            return name, 1.0
+        grams = trigrams(name)
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return None, 0.0
+        candidates, shared = np.unique(np.concatenate(hits), return_counts=True)
+        sizes = np.array([self.sizes[i] for i in candidates])
+        scores = 2 * shared / (len(grams) + sizes)
+        for i in np.argsort(-scores, kind='stable'):
+            if scores[i] < self.threshold:
+                break
+            candidate = self.names[candidates[i]]
+            if words_match(name, candidate):
+                return candidate, float(scores[i])
+        return None, float(scores.max())
+
+    # resolves every raw value not seen before, most frequent first
+    def resolve(self, values):
+        counts = pd.Series(values).value_counts()
+        for raw in counts.index:
+            if raw in self.mapping:
+                continue
+            primary = get_primary_breed(raw)
+            name = normalize_breed(primary)
+            if not name:
+                self.mapping[raw] = (primary, 1.0)
+                continue
+            canonical, score = self.match(name)
+            if canonical is None:
+                canonical, score = self.names[self.add_canonical(name)], 1.0
+            self.mapping[raw] = (canonical, score)
+        return self
+
+    # canonical primary breed of every row; missing breeds stay 'Unknown' like get_primary_breed
+    def canonicalize(self, series):
+        self.resolve(series.dropna())
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        mapped = np.array([self.mapping[value][0] if pd.notna(value) else get_primary_breed(value)
+                           for value in uniques], dtype=object)
+        return pd.Series(mapped[codes], index=series.index)
+
+    def table(self):
+        table = pd.DataFrame([(raw, canonical, score) for raw, (canonical, score) in self.mapping.items()],
+                             columns=['raw', 'canonical', 'score'])
+        return table.sort_values(['canonical', 'raw'], kind='stable').reset_index(drop=True)
+
+
+def save_breed_map(breeds, path=BREED_MAP_PATH):
+    breeds.table().to_csv(path, index=False)
+
+
+# a canonicalizer with the saved mapping (and its canonical names) already known;
+# a missing file gives a fresh one
+def load_breed_map(path=BREED_MAP_PATH, known=KNOWN_BREEDS, threshold=0.7):
+    breeds = BreedCanonicalizer(known, threshold)
+    if os.path.exists(path):
+        table = pd.read_csv(path, keep_default_na=False, dtype={'raw': str, 'canonical': str})
+        for raw, canonical, score in table.itertuples(index=False):
+            breeds.add_canonical(canonical)
+            breeds.mapping[raw] = (canonical, float(score))
+    return breeds
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Map raw Breed strings to canonical primary breeds')
+    parser.add_argument('source', help='csv path or url')
+    parser.add_argument('--map', default=BREED_MAP_PATH, help='mapping table to update')
+    parser.add_argument('--threshold', type=float, default=0.7)
+    args = parser.parse_args()
+
+    breeds = load_breed_map(args.map, threshold=args.threshold)
+    seen = len(breeds.mapping)
+    breeds.resolve(pd.read_csv(args.source, usecols=['Breed'])['Breed'].dropna())
+    save_breed_map(breeds, args.map)
+    table = breeds.table()
+    merged = table[table['canonical'] != table['raw'].map(lambda raw: normalize_breed(get_primary_breed(raw)))]
+    print('%d new raw breeds, %d canonical names' % (len(breeds.mapping) - seen, table['canonical'].nunique()))
+    print(merged.to_string(index=False))
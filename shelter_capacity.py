@@ -0,0 +1,221 @@
+# Kennel occupancy Monte Carlo: replays the intake dates of an export (or of
+# shelter_synthetic data) and gives every intake a stay drawn from the historical
+# stays of its group (Type x PrimaryBreedMix x Intake Type by default), many times.
+#
+# Replicates are rows of (replicates x intakes) arrays: one gather draws every stay
+# (and its outcome, so policies can depend on it), and occupancy per day comes from a
+# bincount of departure days and a cumulative sum, no per-animal objects. Policies
+# rewrite the drawn stays; every policy sees the same draws, so differences between
+# policies are not sampling noise.
+#   result = simulate(df, replicates=1000)
+#   result['occupancy'][['p5', 'p50', 'p95']].plot()
+#   compare_policies(df, {'baseline': None,
+#                         'adopt mixes 25% faster': faster_adoption(0.75),
+#                         'hold strays 10 days': stray_hold(10)}, capacity=400)
+#   python shelter_capacity.py export.csv --replicates 1000 --capacity 400
+
+import numpy as np
+import pandas as pd
+
+from shelter_pipeline import add_breed_columns
+from shelter_profiling import profiled
+from shelter_validation import parse_dates, validate
+
+STAY_COLUMN = 'Days in Shelter'
+GROUPS = ('Type', 'PrimaryBreedMix', 'Intake Type')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+# ------- Policies ----------
+# a policy takes the drawn stays and outcome codes (replicates x intakes), the intake
+# rows and the outcome labels, and returns the stays to simulate
+
+# adopted dogs of a breed group that stayed at least min_days leave after factor of the time
+def faster_adoption(factor=0.75, breed='MIX', min_days=30, animal_type='DOG'):
+    def policy(stays, outcomes, intakes, labels):
+        if 'ADOPTION' not in labels:
+            return stays
+        chosen = ((intakes['PrimaryBreedMix'].to_numpy() == breed)
+                  & (intakes['Type'].to_numpy() == animal_type))
+        target = chosen[None, :] & (outcomes == labels.get_loc('ADOPTION')) & (stays >= min_days)
+        return np.where(target, np.ceil(stays * factor).astype(stays.dtype), stays)
+    return policy
+
+
+# strays not returned to their owner stay at least hold_days
+def stray_hold(hold_days=10):
+    def policy(stays, outcomes, intakes, labels):
+        stray = (intakes['Intake Type'].to_numpy() == 'STRAY')[None, :]
+        if 'RETURN TO OWNER' in labels:
+            stray = stray & (outcomes != labels.get_loc('RETURN TO OWNER'))
+        return np.where(stray, np.maximum(stays, hold_days), stays)
+    return policy
+
+
+# ------- Simulation ----------
+
+def _group_keys(df, groups):
+    return pd.MultiIndex.from_frame(df[list(groups)].astype(object).fillna('(missing)'))
+
+
+# finished historical stays (and outcome codes) sorted by group, with the offset and
+# size of each group's run; every finished stay together is the run (0, total).
+# Quarantined rows and negative stays (even without dates to contradict them) are left out.
+def stay_pools(history, groups=GROUPS, current_date=None):
+    stays = pd.to_numeric(history[STAY_COLUMN], errors='coerce')
+    _, quarantine = validate(history, current_date)
+    finished = (stays.notna() & (stays >= 0) & history['Outcome Type'].notna() & ~quarantine).to_numpy()
+    history = history[finished]
+    codes, keys = pd.factorize(_group_keys(history, groups))
+    outcomes, labels = pd.factorize(history['Outcome Type'])
+    order = np.argsort(codes, kind='stable')
+    sizes = np.bincount(codes, minlength=len(keys))
+    return {
+        'stays': stays.to_numpy()[finished][order].astype(np.int64),
+        'outcomes': outcomes[order],
+        'labels': pd.Index(labels),
+        'offsets': pd.Series(np.cumsum(sizes) - sizes, index=keys),
+        'sizes': pd.Series(sizes, index=keys),
+    }
+
+
+# the pool each intake draws from: its group's, or every stay when the group has
+# fewer than min_count finished stays
+def intake_pools(intakes, pools, groups=GROUPS, min_count=20):
+    keys = _group_keys(intakes, groups)
+    sizes = pools['sizes'].reindex(keys).to_numpy()
+    usable = ~np.isnan(sizes) & (sizes >= min_count)
+    offsets = np.where(usable, pools['offsets'].reindex(keys).to_numpy(), 0).astype(np.int64)
+    sizes = np.where(usable, sizes, len(pools['stays'])).astype(np.int64)
+    return offsets, sizes
+
+
+# intake day numbers of the rows with an intake date, and the first date
+def intake_days(df):
+    intake = parse_dates(df['Intake Date'])
+    keep = intake.notna().to_numpy()
+    first = intake[keep].min()
+    return keep, (intake[keep] - first).dt.days.to_numpy(), first
+
+
+# occupancy (animals in the shelter at the start of each day) of `replicates` runs of
+# the intakes of df; stays come from history (df itself by default), without the
+# rows validate() quarantines
+@profiled('simulate')
+def simulate(df, replicates=1000, policy=None, history=None, groups=GROUPS, min_count=20, seed=0,
+             batch=100, horizon=None, percentiles=PERCENTILES, capacity=None, current_date=None):
+    if 'PrimaryBreedMix' in groups and 'PrimaryBreedMix' not in df.columns:
+        df = add_breed_columns(df.copy())
+    if history is None:
+        history = df
+    elif 'PrimaryBreedMix' in groups and 'PrimaryBreedMix' not in history.columns:
+        history = add_breed_columns(history.copy())
+
+    keep, day, first = intake_days(df)
+    intakes = df[keep]
+    pools = stay_pools(history, groups, current_date)
+    offsets, sizes = intake_pools(intakes, pools, groups, min_count)
+    # days after the last intake, enough for most stays by default
+    if horizon is None:
+        horizon = int(np.percentile(pools['stays'], 99))
+    n_days = int(day.max()) + horizon + 1
+
+    rng = np.random.default_rng(seed)
+    arrivals = np.bincount(day, minlength=n_days)
+    occupancy = np.empty((replicates, n_days), dtype=np.int32)
+    for start in range(0, replicates, batch):
+        rows = min(batch, replicates - start)
+        picks = offsets + (rng.random((rows, len(day))) * sizes).astype(np.int64)
+        stays = pools['stays'][picks]
+        if policy is not None:
+            stays = policy(stays, pools['outcomes'][picks], intakes, pools['labels'])
+        # an animal counts from its intake day up to, not including, its outcome day;
+        # departures past the horizon are never counted
+        leave = np.minimum(day + stays, n_days) + (np.arange(rows) * (n_days + 1))[:, None]
+        departures = np.bincount(leave.ravel(), minlength=rows * (n_days + 1))
+        departures = departures.reshape(rows, n_days + 1)[:, :n_days]
+        occupancy[start:start + rows] = np.cumsum(arrivals - departures, axis=1)
+    return summarize(occupancy, pd.date_range(first, periods=n_days, freq='D', name='date'),
+                     percentiles, capacity)
+
+
+def summarize(occupancy, dates, percentiles=PERCENTILES, capacity=None):
+    table = pd.DataFrame(np.percentile(occupancy, percentiles, axis=0).T, index=dates,
+                         columns=['p%g' % p for p in percentiles])
+    table.insert(0, 'mean', occupancy.mean(axis=0))
+    if capacity is not None:
+        table['p_over_capacity'] = (occupancy > capacity).mean(axis=0)
+    return {'occupancy': table, 'peaks': occupancy.max(axis=1), 'samples': occupancy}
+
+
+# one row per policy: peak occupancy percentiles, and the share of runs and of days
+# over capacity; every policy rewrites the same draws (same seed)
+def compare_policies(df, policies, capacity=None, replicates=1000, seed=0, **kwargs):
+    if 'PrimaryBreedMix' not in df.columns:
+        df = add_breed_columns(df.copy())
+    rows = {}
+    results = {}
+    for name, policy in policies.items():
+        result = simulate(df, replicates, policy, seed=seed, capacity=capacity, **kwargs)
+        peaks = result['peaks']
+        row = {'mean_occupancy': result['samples'].mean(),
+               'peak_p50': np.percentile(peaks, 50), 'peak_p95': np.percentile(peaks, 95)}
+        if capacity is not None:
+            row['runs_over_capacity'] = (peaks > capacity).mean()
+            row['days_over_capacity'] = (result['samples'] > capacity).mean()
+        rows[name] = row
+        results[name] = result
+    return pd.DataFrame.from_dict(rows, orient='index'), results
+
+
+def plot_occupancy(results, capacity=None, band=('p5', 'p95')):
+    import matplotlib.pyplot as plt
+
+    if 'occupancy' in results:
+        results = {'simulated': results}
+    fig, ax = plt.subplots(figsize=(12, 5))
+    for name, result in results.items():
+        table = result['occupancy']
+        line, = ax.plot(table.index, table['p50'], label='%s (median)' % name)
+        ax.fill_between(table.index, table[band[0]], table[band[1]], color=line.get_color(), alpha=0.2)
+    if capacity is not None:
+        ax.axhline(capacity, color='red', linestyle='--', label='capacity')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Animals in shelter')
+    ax.set_title('Simulated kennel occupancy (%s-%s band)' % band)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Monte Carlo kennel occupancy from replayed intakes')
+    parser.add_argument('source', nargs='?', help='csv path or url')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='replay N synthetic rows instead')
+    parser.add_argument('--replicates', type=int, default=1000)
+    parser.add_argument('--capacity', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--adoption-factor', type=float, default=0.75,
+                        help='stay factor for adopted long-stay mixes in the faster-adoption policy')
+    parser.add_argument('--stray-hold', type=int, default=10, help='minimum days for strays in the hold policy')
+    parser.add_argument('--plot', metavar='PNG')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from shelter_synthetic import make_shelter_data
+        df = make_shelter_data(args.synthetic, seed=args.seed)
+    elif args.source:
+        df = pd.read_csv(args.source)
+    else:
+        parser.error('give a source csv or --synthetic N')
+
+    summary, results = compare_policies(df, {
+        'baseline': None,
+        'faster adoption of long-stay mixes': faster_adoption(args.adoption_factor),
+        'stray hold %d days' % args.stray_hold: stray_hold(args.stray_hold),
+    }, capacity=args.capacity, replicates=args.replicates, seed=args.seed)
+    print(summary.to_string(float_format=lambda x: '%.3f' % x))
+    if args.plot:
+        plot_occupancy(results, args.capacity).savefig(args.plot)
@@ -0,0 +1,215 @@
+# Intake-month cohort tables: of the animals taken in each month, the share adopted,
+# returned to owner or euthanized within 7, 30 and 90 days.
+#
+# Every record is bucketed once, intake month by np.searchsorted over month starts
+# and Days in Shelter by np.searchsorted over the horizons, and one bincount fills
+# the whole (month x horizon x outcome) count array. Records are keyed by Impound
+# Number, so update() with a newer export only moves the counts of records that are
+# new or whose outcome changed; rows without one can't be matched across exports and
+# are left out (counted in `unkeyed`). Cohorts too recent to have been watched for a full
+# horizon are left as NaN instead of looking like low shares.
+#   cohorts = CohortMatrix().update(pd.read_csv('sonoma-shelter-15-october-2024.csv'))
+#   cohorts.update(pd.read_csv('sonoma-shelter-17-march-2025.csv'), as_of='2025-03-17')
+#   cohorts.table()['ADOPTION']
+#   python shelter_cohorts.py sonoma-shelter-17-march-2025.csv --state cohorts.pkl
+
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from shelter_profiling import profiled
+from shelter_validation import parse_dates
+
+HORIZONS = (7, 30, 90)
+OUTCOMES = ('ADOPTION', 'RETURN TO OWNER', 'EUTHANIZE')
+KEY_COLUMN = 'Impound Number'
+
+
+# month number since 1970-01 of every intake date (-1 when missing)
+def intake_months(intake):
+    values = intake.to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(values)
+    months = np.full(len(values), -1, dtype=np.int64)
+    if valid.any():
+        first = values[valid].min().astype('datetime64[M]')
+        last = values[valid].max().astype('datetime64[M]')
+        starts = np.arange(first, last + 1).astype('datetime64[ns]')
+        months[valid] = np.searchsorted(starts, values[valid], side='right') - 1 + first.astype(np.int64)
+    return months
+
+
+# 0 for stays of at most horizons[0] days, 1 for at most horizons[1], ...,
+# len(horizons) for longer stays and animals without an outcome
+def horizon_buckets(days, has_outcome, horizons=HORIZONS):
+    buckets = np.searchsorted(np.asarray(horizons, dtype=float), days, side='left')
+    buckets[~has_outcome | np.isnan(days)] = len(horizons)
+    return buckets
+
+
+class CohortMatrix:
+    def __init__(self, horizons=HORIZONS, outcomes=OUTCOMES):
+        self.horizons = tuple(horizons)
+        self.outcomes = list(outcomes)
+        self.first_month = 0
+        # last slot of the horizon axis is 'not within any horizon', of the outcome
+        # axis 'any other outcome'
+        self.counts = np.zeros((0, len(self.horizons) + 1, len(self.outcomes) + 1), dtype=np.int64)
+        self.records = pd.DataFrame(columns=['month', 'bucket', 'outcome'], dtype=np.int64)
+        self.as_of = None
+        self.changed = 0
+        self.unkeyed = 0
+
+    # month, horizon bucket and outcome slot of every record, indexed by key; rows
+    # without a key are dropped
+    def codes(self, df):
+        df = df[df[KEY_COLUMN].notna()]
+        outcome = df['Outcome Type']
+        slots = pd.Index(self.outcomes).get_indexer(outcome)
+        slots[slots < 0] = len(self.outcomes)
+        days = pd.to_numeric(df['Days in Shelter'], errors='coerce').to_numpy(dtype=float)
+        codes = pd.DataFrame({
+            'month': intake_months(parse_dates(df['Intake Date'])),
+            'bucket': horizon_buckets(days, outcome.notna().to_numpy(), self.horizons),
+            'outcome': slots,
+        }, index=df[KEY_COLUMN].to_numpy())
+        codes = codes[codes['month'] >= 0]
+        return codes[~codes.index.duplicated(keep='last')]
+
+    def _grow(self, months):
+        if len(months) == 0:
+            return
+        if len(self.counts) == 0:
+            self.first_month = int(months.min())
+        first = min(self.first_month, int(months.min()))
+        last = max(self.first_month + len(self.counts) - 1, int(months.max()))
+        grown = np.zeros((last - first + 1,) + self.counts.shape[1:], dtype=np.int64)
+        start = self.first_month - first
+        grown[start:start + len(self.counts)] = self.counts
+        self.counts = grown
+        self.first_month = first
+
+    def _add(self, codes, sign):
+        _, n_buckets, n_slots = self.counts.shape
+        flat = ((codes['month'].to_numpy(dtype=np.int64) - self.first_month) * n_buckets
+                + codes['bucket'].to_numpy(dtype=np.int64)) * n_slots + codes['outcome'].to_numpy(dtype=np.int64)
+        self.counts += sign * np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    # adds an export; records seen before are replaced by their new version, records
+    # missing from it are kept. as_of is the export date (default: its latest date)
+    @profiled('aggregate')
+    def update(self, df, as_of=None):
+        codes = self.codes(df)
+        previous = self.records.reindex(codes.index)
+        changed = (previous != codes).any(axis=1).to_numpy()
+        replaced = previous[changed].dropna().astype(np.int64)
+        added = codes[changed]
+
+        self._grow(added['month'].to_numpy())
+        self._add(replaced, -1)
+        self._add(added, 1)
+        self.records = pd.concat([self.records.drop(replaced.index), added])
+
+        if as_of is None:
+            dates = [parse_dates(df[column]).max() for column in ('Intake Date', 'Outcome Date')]
+            as_of = max(date for date in dates if pd.notna(date))
+        as_of = pd.Timestamp(as_of)
+        self.as_of = as_of if self.as_of is None else max(self.as_of, as_of)
+        self.changed = int(changed.sum())
+        self.unkeyed = int(df[KEY_COLUMN].isna().sum())
+        return self
+
+    def months(self):
+        return pd.PeriodIndex.from_ordinals(np.arange(len(self.counts)) + self.first_month, freq='M')
+
+    def intakes(self):
+        return self.counts.sum(axis=(1, 2))
+
+    # (month, horizon) mask of cohorts whose last intake day was watched for the full horizon
+    def complete(self):
+        month_ends = (self.months() + 1).to_timestamp().to_numpy() - np.timedelta64(1, 'D')
+        horizons = np.array(self.horizons, dtype='timedelta64[D]')
+        return month_ends[:, None] + horizons[None, :] <= np.datetime64(self.as_of)
+
+    # (month x horizon x outcome) share of each cohort with that outcome within the horizon
+    def shares(self, incomplete=False):
+        within = self.counts.cumsum(axis=1)[:, :len(self.horizons), :len(self.outcomes)].astype(float)
+        intakes = self.intakes().astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            shares = within / intakes[:, None, None]
+        if not incomplete:
+            shares[~self.complete()] = np.nan
+        return shares
+
+    # one row per intake month, columns (outcome, horizon days) plus the intake count
+    def table(self, incomplete=False):
+        shares = self.shares(incomplete)
+        columns = pd.MultiIndex.from_product([self.outcomes, self.horizons],
+                                             names=['Outcome Type', 'within days'])
+        table = pd.DataFrame(shares.transpose(0, 2, 1).reshape(len(shares), -1), columns=columns,
+                             index=pd.Index(self.months(), name='Intake Month'))
+        table.insert(0, ('intakes', ''), self.intakes())
+        return table[table[('intakes', '')] > 0]
+
+
+def save_cohorts(cohorts, path):
+    with open(path, 'wb') as f:
+        pickle.dump(cohorts, f)
+
+
+def load_cohorts(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# cohorts of every snapshot in a shelter_store, oldest first
+def cohorts_from_store(store_dir=None, **kwargs):
+    from shelter_store import STORE_DIR, load_snapshot, snapshots
+
+    store_dir = store_dir or STORE_DIR
+    cohorts = CohortMatrix(**kwargs)
+    for snapshot_date in snapshots(store_dir):
+        cohorts.update(load_snapshot(snapshot_date, store_dir), as_of=snapshot_date)
+    return cohorts
+
+
+# one line per outcome: share of each intake month's cohort with that outcome within `horizon` days
+@profiled('plot')
+def plot_cohort_shares(table, horizon=30):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 4))
+    shares = table.xs(horizon, axis=1, level='within days')
+    for outcome in shares.columns:
+        ax.plot(shares.index.to_timestamp(), shares[outcome], label=outcome)
+    ax.set_xlabel('intake month')
+    ax.set_ylabel('share of cohort')
+    ax.set_title('Outcome Within %d Days of Intake, by Intake Month' % horizon)
+    ax.legend()
+    return ax
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+
+    from shelter_store import snapshot_date_from_name
+
+    parser = argparse.ArgumentParser(description='Intake-month cohort outcome shares')
+    parser.add_argument('sources', nargs='+', help='csv paths or urls, oldest export first')
+    parser.add_argument('--state', metavar='PKL', help='cohort state to update and save again')
+    parser.add_argument('--incomplete', action='store_true', help='also show cohorts not watched for a full horizon')
+    args = parser.parse_args()
+
+    cohorts = load_cohorts(args.state) if args.state and os.path.exists(args.state) else CohortMatrix()
+    for source in args.sources:
+        try:
+            as_of = snapshot_date_from_name(source)
+        except ValueError:
+            as_of = None
+        cohorts.update(pd.read_csv(source), as_of)
+        print('%s: %d new or changed records, %d rows without an %s left out'
+              % (source, cohorts.changed, cohorts.unkeyed, KEY_COLUMN))
+    if args.state:
+        save_cohorts(cohorts, args.state)
+    print(cohorts.table(args.incomplete).to_string(float_format=lambda x: '%.3f' % x))
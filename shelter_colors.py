@@ -0,0 +1,144 @@
+# Every color and pattern word of `Color` as a multi-hot sparse matrix, instead of
+# only the text before the first '/'.
+#
+# Each distinct Color value is split into tokens once ('GRAY TABBY/WHITE' -> gray,
+# tabby, white) and abbreviations are spelled out (ORG -> orange, PT -> point). Rows
+# get the CSR row of their distinct value, so stay by token for any grouping is one
+# sparse matrix product:
+#   colors = ColorTokens(df['Color'])
+#   token_avg_days(df, colors)                 # every token, all animals
+#   token_avg_days(df, colors, by='Type')      # token x Type
+#   shade_avg_days(df, colors)                 # "do lighter colors get noticed more?"
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from shelter_pipeline import categorize_shade
+from shelter_profiling import count_rows, profiled, stage
+
+STAY_COLUMN = 'Days in Shelter'
+
+ABBREVIATIONS = {
+    'org': 'orange', 'pt': 'point', 'brn': 'brown', 'blk': 'black', 'wht': 'white', 'gry': 'gray',
+    'grey': 'gray', 'choc': 'chocolate', 'tort': 'tortie', 'tri': 'tricolor',
+}
+PATTERNS = {'tabby', 'brindle', 'point', 'merle', 'tortie', 'calico', 'tricolor', 'tick', 'ticked',
+            'spotted', 'smoke', 'lynx', 'torbi', 'dapple', 'harlequin', 'tiger'}
+
+
+def color_tokens(color):
+    if pd.isna(color):
+        return []
+    words = str(color).lower().replace('/', ' ').split()
+    tokens = []
+    for word in words:
+        token = ABBREVIATIONS.get(word, word)
+        if token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+# 'pattern' for pattern words, otherwise the notebook's shade of the word
+def token_kind(token):
+    if token in PATTERNS:
+        return 'pattern'
+    return categorize_shade(token)
+
+
+class ColorTokens:
+    # a stage rather than @profiled, which would see self and the None __init__ returns
+    def __init__(self, colors):
+        with stage('ColorTokens', 'feature', count_rows(colors)) as record:
+            self._build(colors)
+            record['rows_out'] = self.matrix.shape[0]
+
+    def _build(self, colors):
+        codes, uniques = pd.factorize(colors, use_na_sentinel=False)
+        token_lists = [color_tokens(value) for value in uniques]
+        self.vocab = pd.Index(sorted({token for tokens in token_lists for token in tokens}), name='token')
+        self.kinds = pd.Series([token_kind(token) for token in self.vocab], index=self.vocab, name='kind')
+
+        lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.int64)
+        columns = self.vocab.get_indexer([token for tokens in token_lists for token in tokens])
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        distinct = sparse.csr_matrix((np.ones(len(columns)), columns, indptr),
+                                     shape=(len(uniques), len(self.vocab)))
+        # rows x tokens, 1 where the row's Color contains the token
+        self.matrix = distinct[codes]
+
+    def counts(self):
+        return pd.Series(np.asarray(self.matrix.sum(axis=0)).ravel(), index=self.vocab, name='count')
+
+    # rows x shades, 1 where any token of the row has that shade
+    def shade_matrix(self):
+        shades = pd.Index(sorted(self.kinds[self.kinds != 'pattern'].unique()), name='shade')
+        tokens = np.flatnonzero(self.kinds.to_numpy() != 'pattern')
+        token_shades = sparse.csr_matrix(
+            (np.ones(len(tokens)), (tokens, shades.get_indexer(self.kinds.iloc[tokens]))),
+            shape=(len(self.vocab), len(shades)))
+        return (self.matrix @ token_shades > 0).astype(float), shades
+
+
+# count and mean of values per column of a rows x columns 0/1 matrix, per group
+def _matrix_means(matrix, values, groups=None):
+    values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    if groups is None:
+        weights = sparse.csr_matrix(np.column_stack([present, np.where(present, values, 0.0)]))
+        totals = (matrix.T @ weights).toarray()
+        return totals[:, 0], totals[:, 1], None
+    codes, labels = pd.factorize(groups)
+    rows = np.flatnonzero((codes >= 0) & present)
+    onehot = sparse.csr_matrix((np.ones(len(rows)), (rows, codes[rows])), shape=(len(values), len(labels)))
+    counts = (matrix.T @ onehot).toarray()
+    sums = (matrix.T @ onehot.multiply(np.where(present, values, 0.0)[:, None]).tocsr()).toarray()
+    return counts, sums, labels
+
+
+def _stay_table(index, counts, sums, labels, min_count):
+    if labels is None:
+        table = pd.DataFrame({'count': counts, 'avg_days': sums / np.maximum(counts, 1)}, index=index)
+        return table[table['count'] >= min_count].sort_values('avg_days', ascending=False)
+    avg = pd.DataFrame(sums / np.maximum(counts, 1), index=index, columns=labels)
+    return avg.where(counts >= min_count).dropna(how='all')
+
+
+# average stay of the animals whose Color contains each token (an animal counts for
+# every token it has), optionally per group
+@profiled('aggregate')
+def token_avg_days(df, colors=None, by=None, min_count=30):
+    if colors is None:
+        colors = ColorTokens(df['Color'])
+    counts, sums, labels = _matrix_means(colors.matrix, df[STAY_COLUMN], None if by is None else df[by])
+    table = _stay_table(colors.vocab, counts, sums, labels, min_count)
+    if labels is None:
+        table.insert(0, 'kind', colors.kinds[table.index])
+    return table
+
+
+# average stay of animals with any light / medium / dark color, by any token rather
+# than the primary color only
+@profiled('aggregate')
+def shade_avg_days(df, colors=None, by=None, min_count=30):
+    if colors is None:
+        colors = ColorTokens(df['Color'])
+    shades, names = colors.shade_matrix()
+    counts, sums, labels = _matrix_means(shades, df[STAY_COLUMN], None if by is None else df[by])
+    return _stay_table(names, counts, sums, labels, min_count)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Average stay by color and pattern token')
+    parser.add_argument('source', help='csv path or url')
+    parser.add_argument('--by', help="column to split by, e.g. 'Type'")
+    parser.add_argument('--min-count', type=int, default=30)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.source, usecols=lambda column: column in {'Color', STAY_COLUMN, args.by})
+    colors = ColorTokens(df['Color'])
+    print(token_avg_days(df, colors, args.by, args.min_count).to_string(float_format=lambda x: '%.2f' % x))
+    print()
+    print(shade_avg_days(df, colors, args.by, args.min_count).to_string(float_format=lambda x: '%.2f' % x))
@@ -0,0 +1,198 @@
+# The notebook's analyses for several shelters in one run.
+#
+# Every step downstream of loading expects the Sonoma export: its column names
+# ('Days in Shelter', 'Outcome Type', 'Date Of Birth', ...), its category spellings
+# ('RETURN TO OWNER', 'KITTEN'/'PUPPY') and MM/DD/YYYY dates. An adapter describes
+# how one shelter's local export maps onto that schema, and adapt() rewrites the
+# frame so run_pipeline can take it as is. Adapters are dicts, usually kept in a
+# JSON file next to the exports:
+#   {"name": "marin", "source": "marin_animals.csv",
+#    "columns": {"Animal Type": "Type", "Intake Reason": "Intake Type", "DOB": "Date Of Birth"},
+#    "values": {"Type": {"Dog": "DOG", "Cat": "CAT"}, "Outcome Type": {"Returned to Owner": "RETURN TO OWNER"}},
+#    "date_format": "%Y-%m-%d"}
+# Missing columns are added empty, and 'Days in Shelter' is derived from the dates
+# when an export doesn't have it. Values an adapter doesn't map are left as they
+# are and show up as unknown_<column> rules in each shelter's issue table.
+#
+# run_federation() adapts and runs each shelter in its own worker process and
+# stacks the summary tables with a 'Shelter' level so they line up side by side:
+#   tables = run_federation(load_adapters('shelters.json'), workers=4)
+#   tables['overview']; tables['outcome_avg_days']
+#   python shelter_federation.py shelters.json --workers 4 --out federation/
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from shelter_pipeline import run_pipeline
+from shelter_profiling import stage
+from shelter_validation import DATE_FORMAT, length_of_stay, parse_dates
+
+STAY_COLUMN = 'Days in Shelter'
+DATE_COLUMNS = ['Date Of Birth', 'Intake Date', 'Outcome Date']
+# columns of the Sonoma export, in its order
+CANONICAL_COLUMNS = [
+    'Name', 'Type', 'Breed', 'Color', 'Sex', 'Size', 'Date Of Birth', 'Impound Number', 'Kennel Number',
+    'Animal ID', 'Intake Date', 'Outcome Date', STAY_COLUMN, 'Intake Type', 'Intake Subtype',
+    'Outcome Type', 'Outcome Subtype', 'Intake Condition', 'Outcome Condition', 'Intake Jurisdiction',
+    'Outcome Jurisdiction', 'Outcome Zip Code', 'Location', 'Count',
+]
+# the columns the pipeline can't run without
+REQUIRED_COLUMNS = ['Type', 'Breed', 'Color', 'Sex', 'Size', 'Date Of Birth', 'Animal ID',
+                    'Intake Date', 'Outcome Date', 'Outcome Type']
+# tables of run_pipeline that are stacked across shelters
+SUMMARY_TABLES = ['dog_avg_days', 'dog_avg_days_mix', 'cat_avg_days', 'cat_breed_counts',
+                  'combined_avg_days', 'outcome_avg_days', 'sex_median_days', 'issues']
+
+
+# ------- Adapters ----------
+
+# adapters from a JSON file holding a list of them; relative sources are taken
+# relative to the file
+def load_adapters(path):
+    with open(path) as f:
+        adapters = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for adapter in adapters:
+        source = adapter.get('source')
+        if source and '://' not in source and not os.path.isabs(source):
+            adapter['source'] = os.path.join(base, source)
+    return adapters
+
+
+# columns of df that an adapter doesn't account for and canonical columns it leaves missing
+def check_adapter(df, adapter):
+    renamed = [adapter.get('columns', {}).get(column, column) for column in df.columns]
+    missing = [column for column in REQUIRED_COLUMNS if column not in renamed]
+    if STAY_COLUMN not in renamed and not {'Intake Date', 'Outcome Date'} <= set(renamed):
+        missing.append(STAY_COLUMN)
+    return {
+        'unused': [column for column, name in zip(df.columns, renamed) if name not in CANONICAL_COLUMNS],
+        'missing': missing,
+    }
+
+
+# dates as the MM/DD/YYYY strings of the Sonoma export; unreadable values stay as they
+# are so validation reports them as bad_date
+def _format_dates(series, date_format):
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format=date_format, errors='coerce')
+    formatted = parsed.dt.strftime(DATE_FORMAT).where(parsed.notna(), pd.Series(uniques, dtype=object))
+    return pd.Series(np.append(formatted.to_numpy(dtype=object), np.nan)[codes], index=series.index)
+
+
+# one shelter's export in the Sonoma schema: columns renamed, category values
+# respelled, dates reformatted, missing columns added empty
+def adapt(df, adapter):
+    problems = check_adapter(df, adapter)
+    if problems['missing']:
+        raise ValueError('%s: no column maps to %s' % (adapter.get('name', 'shelter'),
+                                                         ', '.join(problems['missing'])))
+    df = df.rename(columns=adapter.get('columns', {}))
+    df = df[[column for column in df.columns if column in CANONICAL_COLUMNS]].copy()
+
+    for column, mapping in adapter.get('values', {}).items():
+        if column in df.columns:
+            # only the distinct values are looked up
+            codes, uniques = pd.factorize(df[column])
+            mapped = np.array([mapping.get(value, value) for value in uniques], dtype=object)
+            df[column] = pd.Series(np.append(mapped, np.nan)[codes], index=df.index)
+
+    date_format = adapter.get('date_format')
+    if date_format and date_format != DATE_FORMAT:
+        for column in DATE_COLUMNS:
+            df[column] = _format_dates(df[column], date_format)
+    if STAY_COLUMN not in df.columns:
+        df[STAY_COLUMN] = length_of_stay(df)
+
+    for column in CANONICAL_COLUMNS:
+        if column not in df.columns:
+            df[column] = np.nan
+    return df[CANONICAL_COLUMNS]
+
+
+# ------- Federated run ----------
+
+# the pipeline on one shelter, in a worker; returns the summary tables and a row of
+# overview numbers instead of the (large) feature frame
+def run_shelter(adapter, current_date=None, drop_quarantined=True, visits='all'):
+    name = adapter.get('name', adapter.get('source'))
+    with stage('adapt ' + name, 'load'):
+        raw = pd.read_csv(adapter['source'], **adapter.get('read_csv', {}))
+        df = adapt(raw, adapter)
+    results = run_pipeline(df, current_date=current_date, drop_quarantined=drop_quarantined, visits=visits)
+    analyzed = results['df']
+    stays = pd.to_numeric(analyzed[STAY_COLUMN], errors='coerce')
+    overview = {
+        'rows': len(raw),
+        'quarantined': int(results['quarantine'].sum()),
+        'analyzed': len(analyzed),
+        'dogs': int((analyzed['Type'] == 'DOG').sum()),
+        'cats': int((analyzed['Type'] == 'CAT').sum()),
+        'mean_days': stays.mean(),
+        'median_days': stays.median(),
+        'adoption_share': (analyzed['Outcome Type'] == 'ADOPTION').mean(),
+        'first_intake': parse_dates(analyzed['Intake Date']).min(),
+        'last_intake': parse_dates(analyzed['Intake Date']).max(),
+    }
+    return name, overview, {key: results[key] for key in SUMMARY_TABLES}
+
+
+# each table of every shelter stacked under a 'Shelter' level, plus an overview row per shelter
+def combine(outputs):
+    tables = {'overview': pd.DataFrame.from_dict({name: overview for name, overview, _ in outputs},
+                                                 orient='index').rename_axis('Shelter')}
+    for key in SUMMARY_TABLES:
+        parts = {name: summaries[key] for name, _, summaries in outputs}
+        if key in ('issues', 'combined_avg_days'):
+            # row-numbered tables
+            tables[key] = pd.concat(parts, names=['Shelter', 'row']).reset_index(level='row', drop=True)
+        else:
+            tables[key] = pd.concat(parts, names=['Shelter'])
+    # one column per shelter where the index means the same thing everywhere
+    tables['outcome_by_shelter'] = tables['outcome_avg_days'].unstack('Shelter')
+    tables['sex_by_shelter'] = tables['sex_median_days'].unstack('Shelter')
+    return tables
+
+
+# adapts and runs every shelter in parallel worker processes (in order when workers is 1)
+def run_federation(adapters, workers=4, current_date=None, drop_quarantined=True, visits='all'):
+    jobs = [(adapter, current_date, drop_quarantined, visits) for adapter in adapters]
+    with stage('run_federation', 'run'):
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                outputs = list(pool.map(run_shelter, *zip(*jobs)))
+        else:
+            outputs = [run_shelter(*job) for job in jobs]
+    return combine(outputs)
+
+
+def save_tables(tables, directory):
+    os.makedirs(directory, exist_ok=True)
+    for key, table in tables.items():
+        table.to_csv(os.path.join(directory, key + '.csv'))
+    return directory
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the shelter analyses across several shelters')
+    parser.add_argument('adapters', help='JSON file with a list of shelter adapters')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--visits', choices=['all', 'first'], default='all')
+    parser.add_argument('--keep-quarantined', action='store_true')
+    parser.add_argument('--out', metavar='DIR', help='write every combined table as csv here')
+    args = parser.parse_args()
+
+    tables = run_federation(load_adapters(args.adapters), args.workers,
+                            drop_quarantined=not args.keep_quarantined, visits=args.visits)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(tables['overview'].to_string(float_format=lambda x: '%.2f' % x))
+        print()
+        print(tables['outcome_by_shelter'].to_string(float_format=lambda x: '%.2f' % x))
+    if args.out:
+        save_tables(tables, args.out)
@@ -0,0 +1,142 @@
+# Mirrors many dated sonoma-shelter-*.csv exports into a local directory at once.
+#
+# Downloads share one aiohttp connection pool. Finished files keep their ETag and
+# Last-Modified in a sidecar .meta.json, so the next run sends a conditional GET and
+# gets a 304 for files that haven't changed. Interrupted downloads stay as .part
+# files and are resumed with a Range request (guarded by If-Range).
+#   python shelter_fetch.py 15-october-2024 17-march-2025
+#   mirror_snapshots(['17-march-2025'], base_url='http://127.0.0.1:8000/')
+
+import asyncio
+import json
+import os
+
+import aiohttp
+
+from shelter_profiling import stage
+
+BASE_URL = 'https://raw.githubusercontent.com/grbruns/cst383/master/'
+MIRROR_DIR = 'shelter_mirror'
+CHUNK_SIZE = 1 << 16
+
+
+# '17-march-2025' -> 'sonoma-shelter-17-march-2025.csv'; full file names pass through
+def snapshot_name(snapshot):
+    if snapshot.endswith('.csv'):
+        return snapshot
+    return 'sonoma-shelter-%s.csv' % snapshot
+
+
+def read_meta(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_meta(path, meta):
+    with open(path, 'w') as f:
+        json.dump(meta, f)
+
+
+def validators(headers):
+    return {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+
+
+# one file: conditional GET if we have it, Range request if a .part is left over
+async def fetch_one(session, url, dest, retries=3):
+    meta_path = dest + '.meta.json'
+    part_path = dest + '.part'
+    part_meta_path = part_path + '.json'
+
+    attempt = 0
+    restarted = False
+    while True:
+        headers = {}
+        meta = read_meta(meta_path) if os.path.exists(dest) else {}
+        part_meta = read_meta(part_meta_path)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+        if offset and (part_meta.get('etag') or part_meta.get('last_modified')):
+            headers['Range'] = 'bytes=%d-' % offset
+            headers['If-Range'] = part_meta.get('etag') or part_meta['last_modified']
+        else:
+            offset = 0
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return {'url': url, 'path': dest, 'status': 'not modified', 'bytes': 0}
+                if response.status == 416 and not restarted:
+                    # our .part doesn't match the server's file any more (or is all of
+                    # it already), start over once; this doesn't use up a retry
+                    for path in (part_path, part_meta_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    restarted = True
+                    continue
+                response.raise_for_status()
+
+                resumed = response.status == 206
+                if not resumed:
+                    offset = 0
+                    write_meta(part_meta_path, validators(response.headers))
+                received = 0
+                with open(part_path, 'ab' if resumed else 'wb') as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+                final_meta = read_meta(part_meta_path)
+        except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            attempt += 1
+            continue
+
+        os.replace(part_path, dest)
+        os.remove(part_meta_path)
+        final_meta['size'] = offset + received
+        write_meta(meta_path, final_meta)
+        return {'url': url, 'path': dest, 'status': 'resumed' if resumed else 'downloaded',
+                'bytes': received}
+
+
+async def fetch_all(snapshots, mirror_dir=MIRROR_DIR, base_url=BASE_URL, concurrency=8, timeout=300):
+    os.makedirs(mirror_dir, exist_ok=True)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        jobs = []
+        for snapshot in snapshots:
+            name = snapshot_name(snapshot)
+            jobs.append(fetch_one(session, base_url + name, os.path.join(mirror_dir, name)))
+        return await asyncio.gather(*jobs, return_exceptions=True)
+
+
+# blocking entry point; failed downloads come back as exceptions in the result list
+def mirror_snapshots(snapshots, mirror_dir=MIRROR_DIR, base_url=BASE_URL, concurrency=8):
+    with stage('mirror_snapshots', 'load'):
+        return asyncio.run(fetch_all(snapshots, mirror_dir, base_url, concurrency))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Mirror dated shelter exports into a local directory')
+    parser.add_argument('snapshots', nargs='+', help="e.g. 17-march-2025 or sonoma-shelter-17-march-2025.csv")
+    parser.add_argument('--mirror-dir', default=MIRROR_DIR)
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    for result in mirror_snapshots(args.snapshots, args.mirror_dir, args.base_url, args.concurrency):
+        if isinstance(result, Exception):
+            print('failed: %r' % (result,))
+        else:
+            print('%-14s %10d bytes  %s' % (result['status'], result['bytes'], result['path']))
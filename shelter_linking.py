@@ -0,0 +1,89 @@
+# Links repeat intakes of the same animal by `Animal ID`.
+#
+# The frame is sorted once by (Animal ID, Intake Date) and each row is compared with
+# the row before it, so visit numbers and "previous visit" columns come from shifted
+# arrays instead of a loop per animal:
+#   df = link_visits(df)
+#   first_df = select_visits(df, 'first')
+
+import numpy as np
+import pandas as pd
+
+from shelter_profiling import profiled
+from shelter_validation import parse_dates
+
+VISIT_COLUMNS = ['visit_number', 'visit_count', 'previous_outcome', 'days_since_last_outcome']
+
+
+# positions that sort the frame by animal, then intake date (row order breaks ties)
+def visit_order(ids, intake):
+    return np.lexsort((np.arange(len(ids)), intake, ids))
+
+
+# an integer code per Animal ID; rows without one get a code of their own each, so
+# they are never linked to another row
+def animal_codes(ids):
+    codes, _ = pd.factorize(ids)
+    missing = codes < 0
+    codes[missing] = -1 - np.arange(missing.sum())
+    return codes
+
+
+@profiled('feature')
+def link_visits(df):
+    ids = animal_codes(df['Animal ID'])
+    intake = parse_dates(df['Intake Date']).to_numpy()
+    order = visit_order(ids, intake)
+    ids = ids[order]
+    intake = intake[order]
+    outcome = parse_dates(df['Outcome Date']).to_numpy()[order]
+    outcome_type = df['Outcome Type'].to_numpy(dtype=object)[order]
+
+    # True where the row is a later visit of the same animal as the row before it
+    repeat = np.zeros(len(df), dtype=bool)
+    repeat[1:] = ids[1:] == ids[:-1]
+
+    # visit number = position within the run of equal ids
+    starts = np.flatnonzero(~repeat)
+    run_id = np.cumsum(~repeat) - 1
+    visit_number = np.arange(len(df)) - starts[run_id] + 1
+    visit_count = np.diff(np.append(starts, len(df)))[run_id]
+
+    previous_outcome = np.empty(len(df), dtype=object)
+    previous_outcome[:] = None
+    previous_outcome[1:][repeat[1:]] = outcome_type[:-1][repeat[1:]]
+
+    days_since = np.full(len(df), np.nan)
+    gap = (intake[1:] - outcome[:-1]) / np.timedelta64(1, 'D')
+    days_since[1:][repeat[1:]] = gap[repeat[1:]]
+
+    # scatter back to the original row order
+    inverse = np.empty(len(df), dtype=np.intp)
+    inverse[order] = np.arange(len(df))
+
+    df = df.copy()
+    df['visit_number'] = visit_number[inverse]
+    df['visit_count'] = visit_count[inverse]
+    df['previous_outcome'] = previous_outcome[inverse]
+    df['days_since_last_outcome'] = days_since[inverse]
+    return df
+
+
+# visits='all' keeps every intake, 'first' keeps each animal's first intake only
+def select_visits(df, visits='all'):
+    if visits == 'all':
+        return df
+    if visits == 'first':
+        if 'visit_number' not in df.columns:
+            df = link_visits(df)
+        return df[df['visit_number'] == 1]
+    raise ValueError("visits must be 'all' or 'first', got %r" % (visits,))
+
+
+# how many animals came in once, twice, ... and the previous outcomes of the repeats
+def repeat_summary(df):
+    if 'visit_number' not in df.columns:
+        df = link_visits(df)
+    animals = df[df['visit_number'] == 1]['visit_count'].value_counts().sort_index()
+    previous = df['previous_outcome'].value_counts()
+    return animals.rename('animals'), previous.rename('repeat intakes')
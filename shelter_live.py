@@ -0,0 +1,319 @@
+# Live mode: keeps the notebook's summary numbers current from a feed of intake and
+# outcome events instead of re-reading the whole export.
+#
+# Events are JSON objects, one per line in a file that is tailed or one per item on
+# a queue.Queue:
+#   {"event": "intake", "Impound Number": "K123", "Type": "DOG", "Breed": "PIT BULL/MIX", ...}
+#   {"event": "outcome", "Impound Number": "K123", "Outcome Type": "ADOPTION", "Days in Shelter": 12, ...}
+# Each event updates dict counters and Welford running mean/variance of the stay per
+# breed, type, sex and outcome in O(1); name/breed/color top-k sketches
+# (shelter_sketches) are fed in small batches. State, including the byte offset in
+# the tailed file, is pickled to a checkpoint so a restart carries on where it stopped.
+# replay() turns an export CSV into the event feed it would have produced, for
+# trying the mode locally:
+#   python shelter_live.py replay sonoma-shelter-17-march-2025.csv events.jsonl
+#   python shelter_live.py run events.jsonl --checkpoint live.pkl --follow
+
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from shelter_model import sex_binary
+from shelter_pipeline import get_primary_breed, get_primary_breed_mix, get_primary_color
+from shelter_profiling import stage
+from shelter_sketches import TypeTopK
+
+KEY_COLUMN = 'Impound Number'
+STAY_COLUMN = 'Days in Shelter'
+ANIMAL_COLUMNS = ['Animal ID', 'Name', 'Type', 'Breed', 'Color', 'Sex', 'Size', 'Date Of Birth']
+INTAKE_COLUMNS = ANIMAL_COLUMNS + ['Intake Date', 'Intake Type', 'Intake Condition']
+OUTCOME_COLUMNS = ANIMAL_COLUMNS + ['Outcome Date', 'Outcome Type', 'Outcome Condition', STAY_COLUMN]
+# groupings with running stay stats; tuples group by several fields
+GROUPINGS = ['Type', 'Sex', 'Outcome Type', 'PrimaryBreed', ('Type', 'PrimaryBreed'),
+             ('Type', 'PrimaryBreedMix'), ('Type', 'sex_binary')]
+
+
+# count, mean and sum of squared deviations of one group, updated one value at a time
+class RunningStats:
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    def __getstate__(self):
+        return (self.count, self.mean, self.m2)
+
+    def __setstate__(self, state):
+        self.count, self.mean, self.m2 = state
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+class LiveAggregates:
+    def __init__(self, sketch_batch=1000):
+        self.intakes = {grouping: {} for grouping in GROUPINGS}
+        self.stays = {grouping: {} for grouping in GROUPINGS}
+        # intake fields of animals still in the shelter, by impound number
+        self.open = {}
+        self.events = 0
+        self.offset = 0
+        self.sketches = TypeTopK()
+        self.sketch_batch = sketch_batch
+        self.pending = []
+        self._breeds = {}
+
+    # derived fields of a record; breed strings are mapped once each
+    def _fields(self, record):
+        breed = record.get('Breed')
+        if breed not in self._breeds:
+            self._breeds[breed] = (get_primary_breed(breed), get_primary_breed_mix(breed))
+        fields = dict(record)
+        fields['PrimaryBreed'], fields['PrimaryBreedMix'] = self._breeds[breed]
+        fields['sex_binary'] = sex_binary(record.get('Sex')) if record.get('Type') in ('CAT', 'DOG') else None
+        return fields
+
+    def _keys(self, fields):
+        for grouping in GROUPINGS:
+            if isinstance(grouping, tuple):
+                key = tuple(fields.get(column) for column in grouping)
+            else:
+                key = fields.get(grouping)
+            if not (_missing(key) or (isinstance(key, tuple) and any(_missing(part) for part in key))):
+                yield grouping, key
+
+    def handle(self, event):
+        kind = event.get('event')
+        if kind == 'intake':
+            fields = self._fields(event)
+            self.open[event.get(KEY_COLUMN)] = fields
+            for grouping, key in self._keys(fields):
+                counts = self.intakes[grouping]
+                counts[key] = counts.get(key, 0) + 1
+            self.pending.append(event)
+            if len(self.pending) >= self.sketch_batch:
+                self.flush_sketches()
+        elif kind == 'outcome':
+            # the intake may predate the feed; the outcome record carries the animal fields too
+            fields = self.open.pop(event.get(KEY_COLUMN), None) or self._fields(event)
+            fields = dict(fields, **{column: event[column] for column in ('Outcome Type', STAY_COLUMN)
+                                     if column in event})
+            stay = fields.get(STAY_COLUMN)
+            if not _missing(stay):
+                for grouping, key in self._keys(fields):
+                    stats = self.stays[grouping]
+                    if key not in stats:
+                        stats[key] = RunningStats()
+                    stats[key].add(float(stay))
+        else:
+            raise ValueError('unknown event %r' % (kind,))
+        self.events += 1
+
+    def flush_sketches(self):
+        if self.pending:
+            # events leave out missing fields, so a batch may lack a column entirely
+            columns = ['Type', 'Breed', 'Color'] + [column for column in self.sketches.columns
+                                                    if column in ANIMAL_COLUMNS]
+            chunk = pd.DataFrame(self.pending).reindex(columns=list(dict.fromkeys(columns)))
+            chunk['Primary Color'] = chunk['Color'].map(get_primary_color)
+            self.sketches.update(chunk)
+            self.pending = []
+
+    # ------- summary tables, shaped like the batch analyses ----------
+
+    # count, mean and standard deviation of the stay per group
+    def stats_table(self, grouping):
+        stats = self.stays[grouping]
+        index = list(stats)
+        if isinstance(grouping, tuple):
+            index = pd.MultiIndex.from_tuples(index, names=list(grouping))
+        else:
+            index = pd.Index(index, name=grouping)
+        return pd.DataFrame({
+            'count': [s.count for s in stats.values()],
+            'mean': [s.mean for s in stats.values()],
+            'std': [np.sqrt(s.variance()) for s in stats.values()],
+        }, index=index).sort_index()
+
+    def intake_counts(self, grouping):
+        return pd.Series(self.intakes[grouping], name='count').sort_values(ascending=False, kind='stable')
+
+    # like shelter_pipeline.outcome_avg_days
+    def outcome_avg_days(self):
+        return self.stats_table('Outcome Type')['mean'].rename(STAY_COLUMN).sort_values(ascending=False)
+
+    # like shelter_pipeline.top_breed_avg_days on the animal_type rows
+    def top_breed_avg_days(self, animal_type, column='PrimaryBreed', n=10):
+        counts = self.intake_counts(('Type', column))
+        counts = counts[counts.index.get_level_values(0) == animal_type].droplevel(0)
+        counts.index.name = column
+        most_common = counts.head(n).index.tolist()
+        means = self.stats_table(('Type', column))['mean']
+        means = means[means.index.get_level_values(0) == animal_type].droplevel(0)
+        return counts, means.reindex(most_common).rename(STAY_COLUMN)
+
+    # like shelter_pipeline.sex_median_days, with means since medians can't be kept in O(1)
+    def sex_mean_days(self):
+        return self.stats_table(('Type', 'sex_binary'))['mean'].rename(STAY_COLUMN)
+
+    def in_shelter(self):
+        return pd.Series([fields.get('Type') for fields in self.open.values()],
+                         dtype=object).value_counts().rename('in shelter')
+
+
+def save_checkpoint(state, path):
+    state.flush_sketches()
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# events appended to a JSON-lines file from byte offset on, with the offset after each
+def tail_events(path, offset=0, follow=False, poll=0.5):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                # nothing new, or a line still being written
+                if not follow:
+                    return
+                f.seek(offset)
+                time.sleep(poll)
+                continue
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+
+# events from a queue.Queue until a None item arrives
+def queue_events(events):
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        yield event, None
+
+
+# consumes events from a file path (tailed) or a queue into state, checkpointing
+# every checkpoint_every events and when the feed ends or is interrupted
+def run_live(source, state=None, checkpoint=None, checkpoint_every=10_000, follow=False, poll=0.5):
+    if state is None:
+        state = load_checkpoint(checkpoint) if checkpoint and os.path.exists(checkpoint) else LiveAggregates()
+    if isinstance(source, str):
+        events = tail_events(source, state.offset, follow, poll)
+    else:
+        events = queue_events(source)
+    try:
+        with stage('run_live', 'live'):
+            for event, offset in events:
+                state.handle(event)
+                if offset is not None:
+                    state.offset = offset
+                if checkpoint and state.events % checkpoint_every == 0:
+                    save_checkpoint(state, checkpoint)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if checkpoint:
+            save_checkpoint(state, checkpoint)
+        else:
+            state.flush_sketches()
+    return state
+
+
+# ------- local stand-in feed ----------
+
+def _record(row, columns):
+    record = {}
+    for column in columns:
+        value = row.get(column)
+        if not _missing(value):
+            record[column] = value.item() if isinstance(value, np.generic) else value
+    return record
+
+
+# the intake and outcome events an export's rows would have produced, in time order
+def replay(df):
+    intake = pd.to_datetime(df['Intake Date'], format='%m/%d/%Y', errors='coerce')
+    outcome = pd.to_datetime(df['Outcome Date'], format='%m/%d/%Y', errors='coerce')
+    times = np.concatenate([intake.to_numpy(), outcome.to_numpy()])
+    # intakes (kind 0) come before outcomes (kind 1) of the same day
+    kinds = np.repeat([0, 1], len(df))
+    rows = np.tile(np.arange(len(df)), 2)
+    keep = ~np.isnat(times) | (kinds == 0)
+    order = np.lexsort((kinds[keep], times[keep]))
+    records = df.to_dict('records')
+    for kind, row in zip(kinds[keep][order], rows[keep][order]):
+        if kind == 0:
+            event = {'event': 'intake', KEY_COLUMN: records[row][KEY_COLUMN]}
+            event.update(_record(records[row], INTAKE_COLUMNS))
+        else:
+            event = {'event': 'outcome', KEY_COLUMN: records[row][KEY_COLUMN]}
+            event.update(_record(records[row], OUTCOME_COLUMNS))
+        yield event
+
+
+# writes the replay of an export as JSON lines; rate limits it to events per second
+def write_replay(df, path, rate=None):
+    with open(path, 'a') as f:
+        for i, event in enumerate(replay(df)):
+            f.write(json.dumps(event) + '\n')
+            if rate:
+                f.flush()
+                time.sleep(1.0 / rate)
+    return path
+
+
+def print_summary(state):
+    print('%d events, %d animals in the shelter' % (state.events, len(state.open)))
+    print(state.outcome_avg_days().to_string())
+    for animal_type in ('DOG', 'CAT'):
+        counts, avg_days = state.top_breed_avg_days(animal_type)
+        print('\n%s breeds' % animal_type)
+        print(pd.DataFrame({'intakes': counts.reindex(avg_days.index), 'avg days': avg_days}).to_string())
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Live aggregates from an intake/outcome event feed')
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay_parser = commands.add_parser('replay', help='write the event feed of an export csv as json lines')
+    replay_parser.add_argument('source', help='csv path or url')
+    replay_parser.add_argument('events', help='json lines file to append to')
+    replay_parser.add_argument('--rate', type=float, help='events per second (default: as fast as possible)')
+    run = commands.add_parser('run', help='consume a json lines event file')
+    run.add_argument('events')
+    run.add_argument('--checkpoint', metavar='PKL', help='state to resume from and save to')
+    run.add_argument('--checkpoint-every', type=int, default=10_000)
+    run.add_argument('--follow', action='store_true', help='keep waiting for new events (Ctrl-C to stop)')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        write_replay(pd.read_csv(args.source), args.events, args.rate)
+    else:
+        state = run_live(args.events, checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                         follow=args.follow)
+        print_summary(state)
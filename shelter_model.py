@@ -0,0 +1,304 @@
+# Length-of-stay regression on a sparse one-hot design, so breed, mix, age, sex,
+# size, type and intake month effects are estimated together instead of one factor
+# at a time.
+#
+# Each row has exactly one nonzero per feature, so the design is a CSR matrix with
+# len(MODEL_FEATURES) + 1 nonzeros per row no matter how many breeds there are.
+#   model = fit_model(df, kind='poisson', alpha=1.0)
+#   coefficient_table(model)
+#   cached_coefficients(df, '2025-03-17')   # fit once per snapshot, then read from disk
+
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy import optimize, sparse
+from scipy.sparse.linalg import lsqr
+
+from shelter_pipeline import categorize_shade, get_primary_breed, get_primary_breed_mix, map_distinct
+from shelter_profiling import profiled
+from shelter_validation import parse_dates
+
+MODEL_FEATURES = ['PrimaryBreed', 'PrimaryBreedMix', 'AgeBin', 'sex_binary', 'Size', 'Type', 'PrimaryShade',
+                  'IntakeMonth']
+MODEL_CACHE_DIR = 'model_cache'
+OTHER_LEVEL = '(other)'
+# ages above this fall in the last bin, so a few bad DOBs can't add hundreds of levels
+MAX_AGE_BIN = 20
+
+
+def sex_binary(sex):
+    if pd.isna(sex):
+        return 1
+    sex = str(sex).lower()
+    return 0 if ('female' in sex or 'spay' in sex) else 1
+
+
+def level_or_unknown(value):
+    return 'Unknown' if pd.isna(value) else value
+
+
+# features that are a function of one raw column: feature -> (raw column, function)
+VALUE_FEATURES = {
+    'PrimaryBreed': ('Breed', get_primary_breed),
+    'PrimaryBreedMix': ('Breed', get_primary_breed_mix),
+    'sex_binary': ('Sex', sex_binary),
+    'Size': ('Size', level_or_unknown),
+    'Type': ('Type', level_or_unknown),
+    'PrimaryShade': ('Color', categorize_shade),
+}
+
+
+# AgeBin and IntakeMonth, the features that come from the date columns
+def date_features(df):
+    intake = parse_dates(df['Intake Date'])
+    age = (intake - parse_dates(df['Date Of Birth'])).dt.days / 365
+    age_bin = np.floor(age.clip(0, MAX_AGE_BIN)) + 0.5
+    return {
+        'AgeBin': age_bin.fillna(-1),  # -1 = unknown DOB
+        'IntakeMonth': intake.dt.month.fillna(0).astype(int),
+    }
+
+
+# the model features from the raw export columns, computed once per distinct value.
+# AgeBin here is the age at intake (the notebook's is the age today), so the same
+# features work for animals that were just admitted.
+@profiled('feature')
+def model_features(df):
+    columns = {name: map_distinct(df[raw], func) for name, (raw, func) in VALUE_FEATURES.items()}
+    columns.update(date_features(df))
+    return pd.DataFrame(columns, index=df.index)[MODEL_FEATURES]
+
+
+# levels seen at least min_count times for each feature; rarer ones share OTHER_LEVEL
+def build_vocab(features, min_count=5):
+    vocab = {}
+    for column in MODEL_FEATURES:
+        counts = features[column].value_counts()
+        vocab[column] = [OTHER_LEVEL] + counts[counts >= min_count].index.tolist()
+    return vocab
+
+
+# column index of every nonzero: intercept column 0, then one block of columns per
+# feature with unseen levels mapped to the block's OTHER_LEVEL column
+def design_indices(features, vocab):
+    n = len(features)
+    indices = [np.zeros(n, dtype=np.int64)]
+    offset = 1
+    for column in MODEL_FEATURES:
+        levels = pd.Index(vocab[column][1:])
+        codes = levels.get_indexer(features[column]) + 1  # unseen -> 0 = OTHER_LEVEL
+        indices.append(codes + offset)
+        offset += len(vocab[column])
+    return np.stack(indices, axis=1), offset
+
+
+def indices_to_csr(indices, width):
+    n, per_row = indices.shape
+    indptr = np.arange(0, n * per_row + 1, per_row)
+    return sparse.csr_matrix((np.ones(n * per_row), indices.ravel(), indptr), shape=(n, width))
+
+
+def design_matrix(features, vocab):
+    return indices_to_csr(*design_indices(features, vocab))
+
+
+# Rows with the same levels on every feature have the same design row, so the fit
+# only needs one row per distinct combination plus its count and stay sums. This
+# is exact for both models and turns millions of rows into tens of thousands.
+def collapse_rows(indices, stay, outcome_codes=None, n_outcomes=0):
+    codes = indices[:, 1:] - indices[:, 1:].min(axis=0)
+    sizes = [int(size) + 1 for size in codes.max(axis=0)]
+    if np.prod(sizes, dtype=object) < 2 ** 63:
+        # one int64 key per row, a mixed-radix number of its codes
+        key = np.zeros(len(indices), dtype=np.int64)
+        for j, size in enumerate(sizes):
+            key = key * size + codes[:, j]
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(codes, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    weight = np.bincount(inverse).astype(float)
+    stay_sum = np.bincount(inverse, weights=stay)
+    log_stay_sum = np.bincount(inverse, weights=np.log1p(stay))
+    if outcome_codes is None:
+        return indices[first], weight, stay_sum, log_stay_sum
+    # outcome counts per distinct row, for the outcome model
+    outcome_counts = np.bincount(inverse * n_outcomes + outcome_codes,
+                                 minlength=len(first) * n_outcomes).reshape(len(first), n_outcomes)
+    return indices[first], weight, stay_sum, log_stay_sum, outcome_counts.astype(float)
+
+
+def column_names(vocab):
+    names = [('(intercept)', '')]
+    for column in MODEL_FEATURES:
+        names += [(column, level) for level in vocab[column]]
+    return names
+
+
+# ridge regression of log1p(stay) on collapsed rows: each distinct row carries its
+# mean log stay, scaled by sqrt(count); solved with LSQR. The penalty is sqrt(alpha)
+# rows appended under every column but the intercept, so like fit_poisson the
+# intercept is not penalized.
+def fit_log_stay(X, weight, log_stay_sum, alpha=1.0):
+    scale = np.sqrt(weight)
+    width = X.shape[1]
+    penalty = sparse.hstack([sparse.csr_matrix((width - 1, 1)), np.sqrt(alpha) * sparse.identity(width - 1)])
+    A = sparse.vstack([sparse.diags(scale) @ X, penalty]).tocsr()
+    b = np.concatenate([log_stay_sum / weight * scale, np.zeros(width - 1)])
+    result = lsqr(A, b, atol=1e-10, btol=1e-10)
+    return result[0]
+
+
+# L2 penalized Poisson regression of stay with a log link on collapsed rows, solved
+# with L-BFGS. The intercept is not penalized.
+def fit_poisson(X, weight, stay_sum, alpha=1.0):
+    XT = X.T.tocsr()
+    n = weight.sum()
+    penalty = np.full(X.shape[1], alpha)
+    penalty[0] = 0.0
+
+    def loss(beta):
+        eta = X @ beta
+        mu = weight * np.exp(eta)
+        value = (mu - stay_sum * eta).sum() + 0.5 * (penalty * beta ** 2).sum()
+        grad = XT @ (mu - stay_sum) + penalty * beta
+        return value / n, grad / n
+
+    beta0 = np.zeros(X.shape[1])
+    beta0[0] = np.log(stay_sum.sum() / n + 1e-9)
+    result = optimize.minimize(loss, beta0, jac=True, method='L-BFGS-B', options={'maxiter': 500})
+    return result.x
+
+
+# L2 penalized multinomial logistic regression on collapsed rows, solved with L-BFGS.
+# counts[g, k] is how many rows with design row g had outcome k. Returns a
+# (columns x outcomes) coefficient matrix.
+def fit_multinomial(X, counts, alpha=1.0):
+    XT = X.T.tocsr()
+    n = counts.sum()
+    width, k = X.shape[1], counts.shape[1]
+    totals = counts.sum(axis=1, keepdims=True)
+    penalty = np.full((width, 1), alpha)
+    penalty[0] = 0.0
+
+    def loss(flat):
+        W = flat.reshape(width, k)
+        logits = X @ W
+        logits -= logits.max(axis=1, keepdims=True)
+        log_p = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+        value = -(counts * log_p).sum() + 0.5 * (penalty * W ** 2).sum()
+        grad = XT @ (totals * np.exp(log_p) - counts) + penalty * W
+        return value / n, grad.ravel() / n
+
+    W0 = np.zeros((width, k))
+    W0[0] = np.log(counts.sum(axis=0) / n + 1e-9)
+    result = optimize.minimize(loss, W0.ravel(), jac=True, method='L-BFGS-B', options={'maxiter': 500})
+    return result.x.reshape(width, k)
+
+
+# outcome classes seen at least min_count times; the rest share OTHER_LEVEL
+@profiled('model')
+def fit_outcome_model(df, alpha=1.0, min_count=5, vocab=None):
+    df = df[df['Outcome Type'].notna()]
+    features = model_features(df)
+    if vocab is None:
+        vocab = build_vocab(features, min_count)
+    counts = df['Outcome Type'].value_counts()
+    outcomes = [OTHER_LEVEL] + counts[counts >= min_count].index.tolist()
+    outcome_codes = pd.Index(outcomes[1:]).get_indexer(df['Outcome Type']) + 1
+    if (outcome_codes == 0).sum() == 0:
+        outcomes = outcomes[1:]
+        outcome_codes -= 1
+
+    indices, width = design_indices(features, vocab)
+    stay = df['Days in Shelter'].fillna(0).to_numpy(dtype=float)
+    indices, _, _, _, outcome_counts = collapse_rows(indices, stay, outcome_codes, len(outcomes))
+    coef = fit_multinomial(indices_to_csr(indices, width), outcome_counts, alpha)
+    return {'kind': 'multinomial', 'alpha': alpha, 'vocab': vocab, 'coef': coef,
+            'outcomes': outcomes, 'rows': len(df)}
+
+
+# probability of each outcome for every row, one column per outcome
+def predict_outcome(model, df, features=None):
+    if features is None:
+        features = model_features(df)
+    logits = design_matrix(features, model['vocab']) @ model['coef']
+    logits -= logits.max(axis=1, keepdims=True)
+    p = np.exp(logits)
+    p /= p.sum(axis=1, keepdims=True)
+    return pd.DataFrame(p, columns=model['outcomes'], index=df.index)
+
+
+@profiled('model')
+def fit_model(df, kind='poisson', alpha=1.0, min_count=5, vocab=None):
+    df = df[df['Days in Shelter'].notna()]
+    features = model_features(df)
+    if vocab is None:
+        vocab = build_vocab(features, min_count)
+    indices, width = design_indices(features, vocab)
+    indices, weight, stay_sum, log_stay_sum = collapse_rows(indices, df['Days in Shelter'].to_numpy(dtype=float))
+    X = indices_to_csr(indices, width)
+    if kind == 'poisson':
+        coef = fit_poisson(X, weight, stay_sum, alpha)
+    elif kind == 'log_stay':
+        coef = fit_log_stay(X, weight, log_stay_sum, alpha)
+    else:
+        raise ValueError("kind must be 'poisson' or 'log_stay', got %r" % (kind,))
+    return {'kind': kind, 'alpha': alpha, 'vocab': vocab, 'coef': coef, 'rows': len(df)}
+
+
+# predicted days in shelter for every row
+def predict_stay(model, df, features=None):
+    if features is None:
+        features = model_features(df)
+    eta = design_matrix(features, model['vocab']) @ model['coef']
+    return np.exp(eta) if model['kind'] == 'poisson' else np.expm1(eta)
+
+
+# one row per coefficient; 'multiplier' is the factor the level applies to the expected stay
+def coefficient_table(model):
+    names = column_names(model['vocab'])
+    table = pd.DataFrame(names, columns=['feature', 'level'])
+    table['level'] = table['level'].astype(str)
+    table['coef'] = model['coef']
+    table['multiplier'] = np.exp(table['coef'])
+    return table
+
+
+def save_model(model, path):
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+
+def load_model(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# coefficient table for one snapshot, fitted on first use and read from cache_dir after
+def cached_coefficients(df, snapshot, kind='poisson', alpha=1.0, cache_dir=MODEL_CACHE_DIR):
+    path = os.path.join(cache_dir, '%s_%s_alpha%g.csv' % (snapshot, kind, alpha))
+    if os.path.exists(path):
+        return pd.read_csv(path, dtype={'level': str}, keep_default_na=False)
+    os.makedirs(cache_dir, exist_ok=True)
+    table = coefficient_table(fit_model(df, kind, alpha))
+    table.to_csv(path, index=False)
+    return table
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from shelter_synthetic import make_shelter_data
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    df = make_shelter_data(rows)
+    for kind in ['poisson', 'log_stay']:
+        start = time.perf_counter()
+        model = fit_model(df, kind)
+        print('%s fit on %d rows: %.2f s' % (kind, rows, time.perf_counter() - start))
+    table = coefficient_table(model)
+    print(table[table['feature'].isin(['PrimaryBreedMix', 'sex_binary', 'Type'])].to_string())
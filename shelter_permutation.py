@@ -0,0 +1,223 @@
+# Permutation tests for the group differences claimed in the notebook write-ups.
+#
+# Each comparison pools the two groups' stays and shuffles them many times; the
+# p-value is the share of shuffles whose mean (or median) difference is at least as
+# extreme as the observed one. A shuffle only decides how many copies of each
+# distinct stay land in group a, which is a multivariate hypergeometric draw, so a
+# batch of shuffles is one (shuffles x distinct stays) count array and the means and
+# medians of both groups come from it directly. Stays are whole days with a few
+# hundred distinct values, so a shuffle costs the same for 1k or 1M animals.
+# Batches of every comparison are spread over a process pool; each batch has its own
+# seed spawned from `seed`, so results don't depend on the number of workers.
+#   permutation_test(cat_days, dog_days, 'median')
+#   pairwise_tests(df['Days in Shelter'], df['Outcome Type'], 'mean')
+#   tables = claim_tests(df)        # sex, type, breed and outcome sections
+#   python shelter_permutation.py export.csv --permutations 20000 --workers 4
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from shelter_pipeline import add_breed_columns, add_sex_binary
+from shelter_profiling import profiled
+
+STAY_COLUMN = 'Days in Shelter'
+PERMUTATIONS_PER_JOB = 2000
+# group a counts held in memory at once per batch
+BATCH_ELEMENTS = 1 << 22
+# columns of the run_tests table
+RESULT_COLUMNS = ['key', 'statistic', 'n_a', 'n_b', 'stat_a', 'stat_b', 'difference', 'p_value']
+
+
+def statistic_function(statistic):
+    if statistic == 'mean':
+        return np.mean
+    if statistic == 'median':
+        return np.median
+    raise ValueError("statistic must be 'mean' or 'median'")
+
+
+# median of every row of a (rows x distinct values) count array
+def count_medians(counts, values, n):
+    cumulative = counts.cumsum(axis=1)
+    low = (cumulative > (n - 1) // 2).argmax(axis=1)
+    high = (cumulative > n // 2).argmax(axis=1)
+    return (values[low] + values[high]) / 2
+
+
+# null differences of `count` shuffles of the pooled values (given as distinct values
+# and their counts), n_a of them going to group a
+def _null_job(values, counts, n_a, statistic, count, seed):
+    rng = np.random.default_rng(seed)
+    n_b = counts.sum() - n_a
+    batch = max(1, min(count, BATCH_ELEMENTS // len(values)))
+    null = np.empty(count)
+    for start in range(0, count, batch):
+        rows = min(batch, count - start)
+        counts_a = rng.multivariate_hypergeometric(counts, n_a, size=rows)
+        if statistic == 'mean':
+            sums = counts_a @ values
+            null[start:start + rows] = sums / n_a - (counts @ values - sums) / n_b
+        else:
+            null[start:start + rows] = (count_medians(counts_a, values, n_a)
+                                        - count_medians(counts - counts_a, values, n_b))
+    return null
+
+
+def p_value(null, observed, alternative='two-sided'):
+    # small tolerance so ties with the observed difference count as extreme
+    tolerance = 1e-9 * max(1.0, abs(observed))
+    if alternative == 'two-sided':
+        extreme = np.abs(null) >= abs(observed) - tolerance
+    elif alternative == 'greater':
+        extreme = null >= observed - tolerance
+    elif alternative == 'less':
+        extreme = null <= observed + tolerance
+    else:
+        raise ValueError("alternative must be 'two-sided', 'greater' or 'less'")
+    return (extreme.sum() + 1) / (len(null) + 1)
+
+
+# Holm step-down adjustment of a vector of p-values
+def holm(p_values):
+    p = np.asarray(p_values, dtype=float)
+    order = np.argsort(p, kind='stable')
+    adjusted = np.minimum(np.maximum.accumulate(p[order] * (len(p) - np.arange(len(p)))), 1.0)
+    result = np.empty_like(p)
+    result[order] = adjusted
+    return result
+
+
+# tests: list of (key, a, b, statistic). Returns one row per test, in order
+@profiled('stats')
+def run_tests(tests, n_permutations=20_000, seed=0, workers=4, alternative='two-sided'):
+    if not tests:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    rows = []
+    for key, a, b, statistic in tests:
+        func = statistic_function(statistic)
+        rows.append({
+            'key': key, 'statistic': statistic, 'n_a': len(a), 'n_b': len(b),
+            'stat_a': float(func(a)), 'stat_b': float(func(b)), 'difference': float(func(a) - func(b)),
+        })
+
+    jobs_per_test = math.ceil(n_permutations / PERMUTATIONS_PER_JOB)
+    seeds = np.random.SeedSequence(seed).spawn(len(tests))
+    jobs = []
+    for (key, a, b, statistic), test_seed in zip(tests, seeds):
+        values, counts = np.unique(np.concatenate([a, b]).astype(float), return_counts=True)
+        for j, job_seed in enumerate(test_seed.spawn(jobs_per_test)):
+            count = min(PERMUTATIONS_PER_JOB, n_permutations - j * PERMUTATIONS_PER_JOB)
+            jobs.append((values, counts, len(a), statistic, count, job_seed))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            nulls = list(pool.map(_null_job, *zip(*jobs)))
+    else:
+        nulls = [_null_job(*job) for job in jobs]
+
+    for i, row in enumerate(rows):
+        null = np.concatenate(nulls[i * jobs_per_test:(i + 1) * jobs_per_test])
+        row['p_value'] = p_value(null, row['difference'], alternative)
+    return pd.DataFrame(rows)
+
+
+def permutation_test(a, b, statistic='mean', n_permutations=20_000, seed=0, workers=1,
+                     alternative='two-sided'):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    table = run_tests([(None, a[~np.isnan(a)], b[~np.isnan(b)], statistic)], n_permutations, seed,
+                      workers, alternative)
+    return table.drop(columns='key').iloc[0]
+
+
+# stays of each group with at least min_count rows, largest groups first
+def group_values(values, groups, min_count=30, order=None):
+    frame = pd.DataFrame({'value': pd.to_numeric(values, errors='coerce'), 'group': groups}).dropna()
+    grouped = {group: part['value'].to_numpy() for group, part in frame.groupby('group')}
+    if order is None:
+        order = sorted(grouped, key=lambda group: -len(grouped[group]))
+    return {group: grouped[group] for group in order if group in grouped and len(grouped[group]) >= min_count}
+
+
+def _pair_tests(section, grouped, statistic):
+    return [((section, group_a, group_b), grouped[group_a], grouped[group_b], statistic)
+            for group_a, group_b in combinations(grouped, 2)]
+
+
+# turns run_tests rows into one table per section with Holm-adjusted p-values; a
+# section without any test (too few groups with min_count rows) gets an empty table
+def _section_tables(table, sections):
+    keys = pd.DataFrame(table.pop('key').tolist(), columns=['section', 'group_a', 'group_b'])
+    table = pd.concat([keys, table], axis=1)
+    tables = {}
+    for section in sections:
+        part = table[table['section'] == section].drop(columns='section').reset_index(drop=True)
+        part['p_holm'] = holm(part['p_value'])
+        tables[section] = part
+    return tables
+
+
+# every pairwise comparison of a statistic of values between groups
+def pairwise_tests(values, groups, statistic='mean', min_count=30, order=None, n_permutations=20_000,
+                   seed=0, workers=4):
+    tests = _pair_tests('pairwise', group_values(values, groups, min_count, order), statistic)
+    return _section_tables(run_tests(tests, n_permutations, seed, workers), ['pairwise'])['pairwise']
+
+
+# the comparisons behind the sex, type, breed and outcome write-ups of the notebook:
+#   sex      median stay of female/male cats and dogs
+#   type     median stay of dogs vs cats
+#   breed    mean stay between the 10 most common dog breeds (primary, and mixes generalized)
+#            and cat breeds
+#   outcome  mean stay between outcome types
+def claim_tests(df, n_permutations=20_000, seed=0, workers=4, top_n=10, min_count=30):
+    if 'PrimaryBreed' not in df.columns:
+        df = add_breed_columns(df.copy())
+    sex_df = add_sex_binary(df)
+    sex_labels = sex_df['Type'] + ' ' + sex_df['sex_binary'].map({0: 'female', 1: 'male'})
+    dogs = df[df['Type'] == 'DOG']
+    cats = df[df['Type'] == 'CAT']
+
+    def top_breeds(frame, column):
+        return frame[column].value_counts().head(top_n).index.tolist()
+
+    sections = {
+        'sex': (group_values(sex_df[STAY_COLUMN], sex_labels, min_count), 'median'),
+        'type': (group_values(df[STAY_COLUMN], df['Type'], min_count, ['DOG', 'CAT']), 'median'),
+        'dog breed': (group_values(dogs[STAY_COLUMN], dogs['PrimaryBreed'], min_count,
+                                   top_breeds(dogs, 'PrimaryBreed')), 'mean'),
+        'dog breed (mixes generalized)': (group_values(dogs[STAY_COLUMN], dogs['PrimaryBreedMix'], min_count,
+                                                       top_breeds(dogs, 'PrimaryBreedMix')), 'mean'),
+        'cat breed': (group_values(cats[STAY_COLUMN], cats['PrimaryBreed'], min_count,
+                                   top_breeds(cats, 'PrimaryBreed')), 'mean'),
+        'outcome': (group_values(df[STAY_COLUMN], df['Outcome Type'], min_count), 'mean'),
+    }
+    tests = []
+    for section, (grouped, statistic) in sections.items():
+        tests += _pair_tests(section, grouped, statistic)
+    return _section_tables(run_tests(tests, n_permutations, seed, workers), list(sections))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Permutation tests for the notebook's group comparisons")
+    parser.add_argument('source', help='csv path or url')
+    parser.add_argument('--permutations', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.source)
+    start = time.perf_counter()
+    tables = claim_tests(df, args.permutations, args.seed, args.workers)
+    for section, table in tables.items():
+        print('\n== %s ==' % section)
+        print(table.to_string(index=False, float_format=lambda x: '%.4g' % x))
+    print('\n%d comparisons x %d permutations in %.1f s'
+          % (sum(len(t) for t in tables.values()), args.permutations, time.perf_counter() - start))
@@ -0,0 +1,350 @@
+# Script version of the load -> feature -> aggregate -> plot steps in sonoma_shelter.py.
+#
+# Each step is a plain function so it can be reused outside the notebook and timed
+# with shelter_profiling. Run it from the command line to profile a full pass:
+#   python shelter_pipeline.py [csv path or url] --profile trace.json
+
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from shelter_linking import link_visits, select_visits
+from shelter_profiling import profiled, stage
+from shelter_validation import validate
+
+DATA_URL = 'https://raw.githubusercontent.com/grbruns/cst383/master/sonoma-shelter-17-march-2025.csv'
+
+
+# ------- Load ----------
+
+# source can also be a frame already in the export's schema (shelter_federation.adapt)
+@profiled('load')
+def load_data(source=DATA_URL):
+    if isinstance(source, pd.DataFrame):
+        return source.copy()
+    return pd.read_csv(source)
+
+
+# ------- Features ----------
+
+# Function to extract primary breed
+def get_primary_breed(breed_string):
+    if pd.isna(breed_string):
+        return "Unknown"
+
+    breed_string = str(breed_string).strip()
+
+    if '/' in breed_string:
+        return breed_string.split('/')[0].strip()
+
+    # For breeds with "MIX" or similar suffix
+    if 'MIX' in breed_string:
+        return breed_string.replace('MIX', '').strip()
+
+    return breed_string
+
+
+# Function to extract primary breed and treat any compound mix as just 'MIX'
+def get_primary_breed_mix(breed_string):
+    if pd.isna(breed_string):
+        return "Unknown"
+
+    breed = str(breed_string).strip()
+
+    return 'MIX' if ('MIX' in breed or '/' in breed) else breed
+
+
+# Function to calculate age in years using 'MM/DD/YYYY'
+def calculate_age(dob_str, current_date):
+    try:
+        if pd.isna(dob_str) or dob_str == "":
+            return np.nan
+        dob = datetime.strptime(dob_str, '%m/%d/%Y')
+        return (current_date - dob).days / 365
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# Function to get primary color from a color string
+def get_primary_color(color):
+    if pd.isnull(color):
+        return 'unknown'
+    return color.split('/')[0].strip().lower()
+
+
+# Function to categorize color into Light, Medium, Dark, or Other shades
+def categorize_shade(color):
+    if pd.isna(color):
+        return 'Unknown'
+
+    primary_color = get_primary_color(color)
+    dark_shades = ['black', 'brown', 'brindle', 'blue', 'gray', 'chocolate', 'seal']
+    medium_shades = ['tan', 'red', 'gold', 'fawn', 'sable', 'yellow', 'orange']
+    light_shades = ['white', 'cream', 'buff']
+
+    if any(shade in primary_color for shade in dark_shades):
+        return 'Dark'
+    elif any(shade in primary_color for shade in medium_shades):
+        return 'Medium'
+    elif any(shade in primary_color for shade in light_shades):
+        return 'Light'
+    else:
+        return 'Other'
+
+
+# applies func once per distinct value instead of once per row, the columns
+# only have a few hundred distinct breeds/colors
+def map_distinct(series, func):
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = np.array([func(value) for value in uniques], dtype=object)
+    return pd.Series(mapped[codes], index=series.index)
+
+
+# breeds is an optional shelter_breeds.BreedCanonicalizer that also merges spelling variants
+@profiled('feature')
+def add_breed_columns(df, breeds=None):
+    if breeds is None:
+        df['PrimaryBreed'] = map_distinct(df['Breed'], get_primary_breed)
+    else:
+        df['PrimaryBreed'] = breeds.canonicalize(df['Breed'])
+    df['PrimaryBreedMix'] = map_distinct(df['Breed'], get_primary_breed_mix)
+    return df
+
+
+@profiled('feature')
+def add_color_columns(df):
+    df['Primary Color'] = map_distinct(df['Color'], get_primary_color)
+    df['Primary Shade'] = map_distinct(df['Color'], categorize_shade)
+    return df
+
+
+@profiled('feature')
+def add_age_columns(df, current_date=None):
+    if current_date is None:
+        current_date = datetime.today()
+    df['Age'] = df['Date Of Birth'].apply(calculate_age, args=(current_date,))
+
+    # one year wide bins, labeled by their midpoints
+    age_min = int(np.floor(df['Age'].min()))
+    age_max = int(np.ceil(df['Age'].max()))
+    bins = np.arange(age_min, age_max + 1, 1)
+    age_labels = (bins[:-1] + bins[1:]) / 2
+    df['AgeBin'] = pd.cut(df['Age'], bins=bins, labels=age_labels, include_lowest=True)
+    return df
+
+
+@profiled('feature')
+def add_size_columns(df):
+    df['is_puppy_kitten'] = (df['Size'] == 'KITTEN') | (df['Size'] == 'PUPPY')
+    df['Days in Shelter_log'] = np.log1p(df['Days in Shelter'])
+    return df
+
+
+# keeps cats and dogs only, like the sex section of the notebook
+@profiled('feature')
+def add_sex_binary(df):
+    df = df[df['Type'].str.lower().isin(['cat', 'dog'])].copy()
+    df['sex_binary'] = df['Sex'].apply(
+        lambda s: 0 if ('female' in s.lower() or 'spay' in s.lower()) else 1
+    )
+    return df
+
+
+# ------- Aggregates ----------
+
+@profiled('aggregate')
+def split_by_type(df):
+    dog_df = df[df['Type'] == 'DOG'].copy()
+    cat_df = df[df['Type'] == 'CAT'].copy()
+    return dog_df, cat_df
+
+
+# counts of the n most common values of column, and their average days in shelter.
+# most_common can come from a streamed summary (shelter_sketches.TypeTopK.top) instead
+# of the full value_counts
+@profiled('aggregate')
+def top_breed_avg_days(df, column='PrimaryBreed', n=10, most_common=None):
+    counts = df[column].value_counts()
+    if most_common is None:
+        most_common = counts.head(n).index.tolist()
+    avg_days = df[df[column].isin(most_common)].groupby(column)['Days in Shelter'].mean().reindex(most_common)
+    return counts, avg_days
+
+
+@profiled('aggregate')
+def age_avg_days(df):
+    filtered_df = df[df['Type'].isin(['CAT', 'DOG'])]
+    combined_avg_days = filtered_df.groupby('AgeBin', observed=False)['Days in Shelter'].mean().reset_index()
+    return combined_avg_days.sort_values('AgeBin')
+
+
+@profiled('aggregate')
+def outcome_avg_days(df):
+    return df.groupby('Outcome Type')['Days in Shelter'].mean().sort_values(ascending=False)
+
+
+@profiled('aggregate')
+def sex_median_days(df):
+    return df.groupby(['Type', 'sex_binary'])['Days in Shelter'].median()
+
+
+# ------- Plots ----------
+
+@profiled('plot')
+def plot_breed_avg_days(avg_days, title, counts=None):
+    import matplotlib.pyplot as plt
+
+    sorted_avg_days = avg_days.sort_values(ascending=False)
+    fig, ax = plt.subplots(figsize=(12, 4))
+    ax.bar(sorted_avg_days.index, sorted_avg_days.values, width=0.6)
+    ax.set_title(title)
+    ax.set_xlabel('Breed')
+    ax.set_ylabel('Average Days')
+    ax.tick_params(axis='x', rotation=45)
+    if counts is not None:
+        for i, breed in enumerate(sorted_avg_days.index):
+            ax.text(i, sorted_avg_days[breed] + 0.25, f"n={counts[breed]}", ha='center')
+    return ax
+
+
+@profiled('plot')
+def plot_age_avg_days(combined_avg_days):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.bar(combined_avg_days['AgeBin'], combined_avg_days['Days in Shelter'])
+    ax.set_xlabel('age (years)')
+    ax.set_ylabel('average days in shelter')
+    ax.set_title('Average Days in Shelter by Age (Cats and Dogs Combined)')
+    return ax
+
+
+@profiled('plot')
+def plot_size_violin(df):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots()
+    sns.violinplot(x='is_puppy_kitten', y='Days in Shelter_log', data=df, ax=ax)
+    ax.set_title('Days in Shelter for Puppies and Kittens (Log-Transformed)')
+    ax.set_xlabel('Is Puppy or Kitten')
+    ax.set_ylabel('Days in shelter (log scale)')
+    return ax
+
+
+@profiled('plot')
+def plot_outcome_avg_days(outcome_days):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    outcome_days.plot.bar(ax=ax)
+    ax.set_xlabel('Outcome Type')
+    ax.set_ylabel('Average Days in Shelter')
+    ax.set_title('Average Days in Shelter by Outcome Type')
+    ax.tick_params(axis='x', rotation=45)
+    return ax
+
+
+# ------- Full run ----------
+
+# runs every step of the notebook in order and returns the aggregate tables.
+# Rows failing the data-quality rules in shelter_validation are left out unless
+# drop_quarantined is False. visits='first' runs every aggregate on each animal's
+# first intake only instead of across all visits. breed_map is the path of a
+# shelter_breeds mapping table; when given, spelling variants of a breed are merged
+# and newly seen breed strings are added to the table. engine='polars' runs the same
+# chain as one lazy query (shelter_polars.run_lazy) and returns the same aggregate
+# tables and quarantine mask, but no df or issues.
+def run_pipeline(source=DATA_URL, plots=False, current_date=None, drop_quarantined=True, visits='all',
+                 breed_map=None, engine='pandas'):
+    if engine == 'polars':
+        if breed_map is not None:
+            raise ValueError('breed_map is only supported by the pandas engine')
+        from shelter_polars import run_lazy
+
+        return run_lazy(source, plots, current_date, drop_quarantined, visits)
+    if engine != 'pandas':
+        raise ValueError("engine must be 'pandas' or 'polars', got %r" % (engine,))
+    breeds = None
+    if breed_map is not None:
+        from shelter_breeds import load_breed_map, save_breed_map
+
+        breeds = load_breed_map(breed_map)
+    with stage('run_pipeline', 'run'):
+        df = load_data(source)
+        issues, quarantine = validate(df, current_date)
+        if drop_quarantined:
+            df = df[~quarantine].copy()
+        df = select_visits(link_visits(df), visits)
+        df = add_breed_columns(df, breeds)
+        if breeds is not None:
+            save_breed_map(breeds, breed_map)
+        df = add_age_columns(df, current_date)
+        df = add_size_columns(df)
+
+        dog_df, cat_df = split_by_type(df)
+        dog_breed_counts, dog_avg_days = top_breed_avg_days(dog_df, 'PrimaryBreed')
+        dog_breed_counts_mix, dog_avg_days_mix = top_breed_avg_days(dog_df, 'PrimaryBreedMix')
+        cat_breed_counts, cat_avg_days = top_breed_avg_days(cat_df, 'PrimaryBreed')
+        combined_avg_days = age_avg_days(df)
+        outcome_days = outcome_avg_days(df)
+        sex_df = add_sex_binary(df)
+        sex_days = sex_median_days(sex_df)
+
+        if plots:
+            import matplotlib.pyplot as plt
+
+            plot_breed_avg_days(dog_avg_days, 'Average Days in Shelter for Most Common Dog Breeds')
+            plot_breed_avg_days(dog_avg_days_mix,
+                                'Average Days in Shelter for Most Common Dog Breeds (Mixed Generalized)')
+            plot_breed_avg_days(cat_avg_days, 'Average Days in Shelter for Most Common Cat Breeds',
+                                counts=cat_breed_counts)
+            plot_age_avg_days(combined_avg_days)
+            plot_size_violin(df)
+            plot_outcome_avg_days(outcome_days)
+            plt.close('all')
+
+    return {
+        'df': df,
+        'issues': issues,
+        'quarantine': quarantine,
+        'dog_avg_days': dog_avg_days,
+        'dog_avg_days_mix': dog_avg_days_mix,
+        'cat_avg_days': cat_avg_days,
+        'cat_breed_counts': cat_breed_counts,
+        'combined_avg_days': combined_avg_days,
+        'outcome_avg_days': outcome_days,
+        'sex_median_days': sex_days,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import shelter_profiling
+
+    parser = argparse.ArgumentParser(description='Run the shelter analysis steps')
+    parser.add_argument('source', nargs='?', default=DATA_URL, help='csv path or url')
+    parser.add_argument('--plots', action='store_true', help='also render the plots')
+    parser.add_argument('--keep-quarantined', action='store_true',
+                        help='keep rows that fail the data-quality rules')
+    parser.add_argument('--visits', choices=['all', 'first'], default='all',
+                        help="'first' to only count each animal's first intake")
+    parser.add_argument('--breed-map', metavar='CSV', help='merge breed spelling variants using this mapping table')
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas',
+                        help="'polars' runs the steps as one lazy query (aggregates only, no issue table)")
+    parser.add_argument('--profile', metavar='TRACE_JSON', help='profile every step and write a json trace')
+    args = parser.parse_args()
+
+    if args.profile:
+        shelter_profiling.enable()
+    results = run_pipeline(args.source, plots=args.plots, drop_quarantined=not args.keep_quarantined,
+                           visits=args.visits, breed_map=args.breed_map, engine=args.engine)
+    if args.profile:
+        shelter_profiling.write_trace(args.profile)
+        print(shelter_profiling.summary(), file=sys.stderr)
+    if 'issues' in results:
+        print(results['issues'].to_string())
+    print(results['outcome_avg_days'])
@@ -0,0 +1,301 @@
+# The shelter_pipeline chain (load -> validate -> visits -> features -> aggregates)
+# as one Polars LazyFrame query, used by run_pipeline(engine='polars').
+#
+# Nothing is materialized between steps: Polars only reads the CSV columns the
+# aggregates use, pushes the quarantine/type filters down, computes the shared
+# feature frame once for every aggregate (collect_all) and runs on all cores. Results
+# come back as the same pandas objects run_pipeline returns, and check_parity()
+# compares the two engines value for value.
+#   results = run_lazy('sonoma-shelter-17-march-2025.csv')
+#   check_parity('sonoma-shelter-17-march-2025.csv', current_date=datetime(2025, 3, 17))
+#   python shelter_polars.py --rows 1000000      # benchmark against the pandas engine
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from shelter_pipeline import DATA_URL
+from shelter_profiling import profiled, stage
+from shelter_validation import DATE_FORMAT, QUARANTINE_RULES
+
+STAY_COLUMN = 'Days in Shelter'
+# what pd.read_csv reads as missing by default, so both engines see the same nulls
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+AGGREGATE_KEYS = ['dog_avg_days', 'dog_avg_days_mix', 'cat_avg_days', 'cat_breed_counts',
+                  'combined_avg_days', 'outcome_avg_days', 'sex_median_days']
+
+
+# a csv path or url, or a pandas frame already loaded (every column read as text,
+# like the csv)
+def scan(source):
+    if isinstance(source, pd.DataFrame):
+        lf = pl.from_pandas(source).lazy().with_columns(pl.all().cast(pl.String))
+    else:
+        lf = pl.scan_csv(source, infer_schema=False, null_values=PANDAS_NA_VALUES)
+    return lf.with_columns(pl.col(STAY_COLUMN).cast(pl.Float64, strict=False))
+
+
+def parse_date(column):
+    return pl.col(column).str.strptime(pl.Date, DATE_FORMAT, strict=False)
+
+
+# ------- Validate ----------
+
+# the shelter_validation quarantine rules as one boolean expression
+def quarantine_expr(current_date):
+    intake = parse_date('Intake Date')
+    outcome = parse_date('Outcome Date')
+    dob = parse_date('Date Of Birth')
+    stay = (outcome - intake).dt.total_days()
+
+    rules = {
+        'stay_mismatch': stay.is_not_null() & (stay != pl.col(STAY_COLUMN)).fill_null(True),
+        'outcome_before_intake': (outcome < intake).fill_null(False),
+        # a midnight dob is after the current timestamp exactly when it is after its date
+        'dob_in_future': (dob > pl.lit(current_date).cast(pl.Datetime('us')).cast(pl.Date)).fill_null(False),
+        'dob_after_intake': (dob > intake).fill_null(False),
+        'bad_date': pl.any_horizontal([pl.col(column).is_not_null() & parsed.is_null() for column, parsed in
+                                       (('Intake Date', intake), ('Outcome Date', outcome), ('Date Of Birth', dob))]),
+    }
+    return pl.any_horizontal([rules[rule] for rule in QUARANTINE_RULES])
+
+
+# keeps each animal's first intake, ties broken by row order like shelter_linking.visit_order;
+# rows without an Animal ID are each their own animal
+def first_visits(lf):
+    ranked = lf.with_row_index('_row').sort(['_animal', '_intake', '_row'], nulls_last=True)
+    first = pl.col('_animal').is_null() | pl.col('_animal').is_first_distinct()
+    return ranked.filter(first).sort('_row').drop('_row')
+
+
+# ------- Features ----------
+
+def primary_breed_expr():
+    breed = pl.col('Breed').str.strip_chars()
+    return (pl.when(breed.str.contains('/', literal=True))
+              .then(breed.str.split('/').list.first().str.strip_chars())
+              .when(breed.str.contains('MIX', literal=True))
+              .then(breed.str.replace_all('MIX', '', literal=True).str.strip_chars())
+              .otherwise(breed)
+              .fill_null('Unknown'))
+
+
+def primary_breed_mix_expr():
+    breed = pl.col('Breed').str.strip_chars()
+    return (pl.when(breed.str.contains('MIX', literal=True) | breed.str.contains('/', literal=True))
+              .then(pl.lit('MIX'))
+              .otherwise(breed)
+              .fill_null('Unknown'))
+
+
+# calculate_age: whole days between current_date and the date of birth, over 365
+def age_expr(current_date):
+    dob = parse_date('Date Of Birth').cast(pl.Datetime('us'))
+    days = (pl.lit(current_date).cast(pl.Datetime('us')) - dob).dt.total_microseconds() // 86_400_000_000
+    return days / 365
+
+
+# pd.cut into one year bins from floor(min age) to ceil(max age), labeled by midpoints
+def age_bin_expr():
+    age_min = pl.col('Age').min().floor()
+    index = ((pl.col('Age') - age_min).ceil() - 1).clip(lower_bound=0)
+    return age_min + index + 0.5
+
+
+def features(lf, current_date):
+    return lf.with_columns(
+        PrimaryBreed=primary_breed_expr(),
+        PrimaryBreedMix=primary_breed_mix_expr(),
+        Age=age_expr(current_date),
+    ).with_columns(
+        AgeBin=age_bin_expr(),
+        is_puppy_kitten=pl.col('Size').is_in(['KITTEN', 'PUPPY']).fill_null(False),
+    )
+
+
+# ------- Aggregates ----------
+
+# value_counts(): count descending, ties in order of first appearance
+def value_counts(lf, column):
+    return (lf.filter(pl.col(column).is_not_null())
+              .group_by(column, maintain_order=True).agg(pl.len().alias('count'))
+              .sort('count', descending=True, maintain_order=True))
+
+
+def group_means(lf, column):
+    return lf.group_by(column).agg(pl.col(STAY_COLUMN).mean())
+
+
+def _counts_series(frame, column):
+    return pd.Series(frame['count'].to_numpy(), index=pd.Index(frame[column].to_list(), name=column),
+                     name='count')
+
+
+def _means_series(frame, columns):
+    index = (pd.Index(frame[columns[0]].to_list(), name=columns[0]) if len(columns) == 1 else
+             pd.MultiIndex.from_arrays([frame[column].to_list() for column in columns], names=columns))
+    return pd.Series(frame[STAY_COLUMN].cast(pl.Float64).to_numpy(), index=index, name=STAY_COLUMN)
+
+
+# the aggregate tables and quarantine mask of run_pipeline, as the same pandas objects;
+# the feature frame ('df') and issue table ('issues') are only built by the pandas engine
+@profiled('run')
+def run_lazy(source=DATA_URL, plots=False, current_date=None, drop_quarantined=True, visits='all', n=10):
+    if current_date is None:
+        current_date = datetime.today()
+    if visits not in ('all', 'first'):
+        raise ValueError("visits must be 'all' or 'first', got %r" % (visits,))
+
+    lf = scan(source).with_columns(_quarantine=quarantine_expr(current_date))
+    kept = lf.filter(~pl.col('_quarantine')) if drop_quarantined else lf
+    if visits == 'first':
+        kept = first_visits(kept.with_columns(_animal=pl.col('Animal ID'),
+                                              _intake=parse_date('Intake Date')))
+    df = features(kept, current_date)
+
+    dogs = df.filter(pl.col('Type') == 'DOG')
+    cats = df.filter(pl.col('Type') == 'CAT')
+    cats_dogs = df.filter(pl.col('Type').is_in(['CAT', 'DOG']))
+    sex = df.filter(pl.col('Type').str.to_lowercase().is_in(['cat', 'dog'])).with_columns(
+        sex_binary=pl.when(pl.col('Sex').str.to_lowercase().str.contains('female|spay')).then(0).otherwise(1))
+
+    queries = {
+        'quarantine': lf.select('_quarantine'),
+        'dog_counts': value_counts(dogs, 'PrimaryBreed'),
+        'dog_means': group_means(dogs, 'PrimaryBreed'),
+        'dog_counts_mix': value_counts(dogs, 'PrimaryBreedMix'),
+        'dog_means_mix': group_means(dogs, 'PrimaryBreedMix'),
+        'cat_counts': value_counts(cats, 'PrimaryBreed'),
+        'cat_means': group_means(cats, 'PrimaryBreed'),
+        'age_bins': df.select(pl.col('Age').min().floor().alias('low'), pl.col('Age').max().ceil().alias('high')),
+        'age_means': group_means(cats_dogs.filter(pl.col('AgeBin').is_not_null()), 'AgeBin'),
+        'outcome_means': group_means(df.filter(pl.col('Outcome Type').is_not_null()), 'Outcome Type'),
+        'sex_medians': sex.group_by(['Type', 'sex_binary']).agg(pl.col(STAY_COLUMN).median()),
+    }
+    if plots:
+        queries['size_days'] = df.select('is_puppy_kitten', pl.col(STAY_COLUMN).log1p().alias('Days in Shelter_log'))
+    with stage('collect', 'polars'):
+        frames = dict(zip(queries, pl.collect_all(list(queries.values()))))
+
+    index = source.index if isinstance(source, pd.DataFrame) else None
+    results = {'quarantine': pd.Series(frames['quarantine']['_quarantine'].to_numpy(), index=index)}
+    for key, counts, means, column in (('dog_avg_days', 'dog_counts', 'dog_means', 'PrimaryBreed'),
+                                       ('dog_avg_days_mix', 'dog_counts_mix', 'dog_means_mix', 'PrimaryBreedMix'),
+                                       ('cat_avg_days', 'cat_counts', 'cat_means', 'PrimaryBreed')):
+        breed_counts = _counts_series(frames[counts], column)
+        results[key] = _means_series(frames[means], [column]).reindex(breed_counts.index[:n])
+    results['cat_breed_counts'] = breed_counts
+
+    # every one-year bin, empty ones as NaN, like groupby(observed=False) on the pd.cut column
+    low, high = frames['age_bins'].row(0)
+    if low is None:
+        labels = np.array([])
+    else:
+        labels = np.arange(low, high) + 0.5
+    age_means = _means_series(frames['age_means'], ['AgeBin'])
+    results['combined_avg_days'] = pd.DataFrame({
+        'AgeBin': pd.Categorical(labels, categories=labels, ordered=True),
+        STAY_COLUMN: age_means.reindex(labels).to_numpy(),
+    })
+    results['outcome_avg_days'] = (_means_series(frames['outcome_means'], ['Outcome Type'])
+                                   .sort_values(ascending=False))
+    results['sex_median_days'] = _means_series(frames['sex_medians'], ['Type', 'sex_binary']).sort_index()
+
+    if plots:
+        _plot(results, frames['size_days'].to_pandas())
+    return results
+
+
+def _plot(results, size_days):
+    import matplotlib.pyplot as plt
+
+    from shelter_pipeline import plot_age_avg_days, plot_breed_avg_days, plot_outcome_avg_days, plot_size_violin
+
+    plot_breed_avg_days(results['dog_avg_days'], 'Average Days in Shelter for Most Common Dog Breeds')
+    plot_breed_avg_days(results['dog_avg_days_mix'],
+                        'Average Days in Shelter for Most Common Dog Breeds (Mixed Generalized)')
+    plot_breed_avg_days(results['cat_avg_days'], 'Average Days in Shelter for Most Common Cat Breeds',
+                        counts=results['cat_breed_counts'])
+    plot_age_avg_days(results['combined_avg_days'])
+    plot_size_violin(size_days)
+    plot_outcome_avg_days(results['outcome_avg_days'])
+    plt.close('all')
+
+
+# ------- Parity and benchmark ----------
+
+def _comparable(value):
+    if isinstance(value, pd.DataFrame):
+        value = value.copy()
+        value['AgeBin'] = value['AgeBin'].astype(float)
+        return value.reset_index(drop=True)
+    value = value.copy()
+    value.name = None
+    return value
+
+
+# runs both engines on the same source and raises AssertionError on the first difference
+def check_parity(source, current_date=None, drop_quarantined=True, visits='all', rtol=1e-9):
+    from shelter_pipeline import run_pipeline
+
+    if current_date is None:
+        current_date = datetime.today()
+    eager = run_pipeline(source, current_date=current_date, drop_quarantined=drop_quarantined, visits=visits)
+    lazy = run_lazy(source, current_date=current_date, drop_quarantined=drop_quarantined, visits=visits)
+    for key in AGGREGATE_KEYS:
+        expected, actual = _comparable(eager[key]), _comparable(lazy[key])
+        try:
+            if isinstance(expected, pd.DataFrame):
+                pd.testing.assert_frame_equal(expected, actual, check_dtype=False, rtol=rtol)
+            else:
+                pd.testing.assert_series_equal(expected, actual, check_dtype=False, check_index_type=False,
+                                               rtol=rtol)
+        except AssertionError as e:
+            raise AssertionError('%s differs between the pandas and polars engines:\n%s' % (key, e)) from None
+    if not np.array_equal(eager['quarantine'].to_numpy(), lazy['quarantine'].to_numpy()):
+        raise AssertionError('quarantined rows differ: %d vs %d' % (eager['quarantine'].sum(),
+                                                                   lazy['quarantine'].sum()))
+    return True
+
+
+# wall time of both engines on a synthetic export with `rows` rows
+def benchmark(rows=1_000_000, repeat=3):
+    import os
+    import tempfile
+    import time
+
+    from shelter_pipeline import run_pipeline
+    from shelter_synthetic import make_shelter_data
+
+    current_date = datetime(2025, 3, 17)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.csv')
+        make_shelter_data(rows, seed=0).to_csv(path, index=False)
+        check_parity(path, current_date)
+        print('parity: pandas and polars results match on %d rows' % rows)
+        for name, run in (('pandas', run_pipeline), ('polars', run_lazy)):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run(path, current_date=current_date)
+                times.append(time.perf_counter() - start)
+            print('%-7s best of %d: %.2f s' % (name, repeat, min(times)))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check and time the polars engine against the pandas one')
+    parser.add_argument('source', nargs='?', help='csv to check parity on (default: benchmark synthetic data)')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--visits', choices=['all', 'first'], default='all')
+    args = parser.parse_args()
+
+    if args.source:
+        check_parity(args.source, visits=args.visits)
+        print('pandas and polars results match')
+    else:
+        benchmark(args.rows)
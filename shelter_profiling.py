@@ -0,0 +1,222 @@
+# Per-stage timing and memory instrumentation for the shelter analysis steps.
+#
+# Usage:
+#   import shelter_profiling as prof
+#   prof.enable()
+#   ... run steps decorated with @prof.profiled('feature') or wrapped in prof.stage(...)
+#   print(prof.summary())
+#   prof.write_trace('trace.json')
+#
+# When profiling is disabled (the default) the decorator only does a single
+# attribute check before calling the wrapped function.
+
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+try:
+    import resource  # not available on windows
+except ImportError:
+    resource = None
+
+
+# peak resident set size of the whole process so far, in MB
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KB, macOS reports bytes
+    if os.uname().sysname == 'Darwin':
+        return peak / 2**20
+    return peak / 2**10
+
+
+# length of a DataFrame/Series/array argument or result, None for anything else
+def count_rows(obj):
+    if obj is None or isinstance(obj, (str, bytes, dict)):
+        return None
+    if hasattr(obj, 'shape') and len(getattr(obj, 'shape', ())) > 0:
+        return int(obj.shape[0])
+    if isinstance(obj, (list, tuple)) and obj:
+        # steps like split_by_type return several frames
+        counts = [count_rows(item) for item in obj]
+        counts = [c for c in counts if c is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+class _NullStage:
+    # shared no-op context manager handed out while profiling is disabled
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name, kind, rows_in):
+        self.profiler = profiler
+        self.record = {'name': name, 'kind': kind, 'rows_in': rows_in, 'rows_out': None}
+
+    def __enter__(self):
+        self.profiler._push(self.record)
+        return self.record
+
+    def __exit__(self, *exc):
+        self.profiler._pop(self.record)
+        return False
+
+
+class Profiler:
+    def __init__(self, trace_memory=True):
+        self.enabled = False
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+        self._t0 = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        self.enabled = True
+        self._t0 = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        self.enabled = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def reset(self):
+        self.records = []
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    def stage(self, name, kind='step', rows_in=None):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, kind, rows_in)
+
+    def _push(self, record):
+        parent = self._stack[-1] if self._stack else None
+        record['depth'] = len(self._stack)
+        record['path'] = (parent['path'] + ';' if parent else '') + record['name']
+        if tracemalloc.is_tracing():
+            # the parent keeps whatever peak it reached before the child resets the counter
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent['_peak'] = max(parent['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_base'] = current
+            record['_peak'] = current
+        record['start_s'] = time.perf_counter() - self._t0
+        record['_wall0'] = time.perf_counter()
+        record['_cpu0'] = time.process_time()
+        self._stack.append(record)
+
+    def _pop(self, record):
+        record['wall_s'] = time.perf_counter() - record.pop('_wall0')
+        record['cpu_s'] = time.process_time() - record.pop('_cpu0')
+        self._stack.pop()
+        if '_peak' in record:
+            peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+            record['peak_traced_mb'] = (peak - record.pop('_base')) / 2**20
+            if self._stack:
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+        else:
+            record['peak_traced_mb'] = None
+        record['peak_rss_mb'] = peak_rss_mb()
+        self.records.append(record)
+
+    def profiled(self, kind='step', name=None):
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                rows_in = count_rows(args[0]) if args else None
+                with self.stage(stage_name, kind, rows_in) as record:
+                    result = func(*args, **kwargs)
+                    record['rows_out'] = count_rows(result)
+                return result
+            return wrapper
+        return decorator
+
+    # records in the order the stages started
+    def trace(self):
+        return sorted(self.records, key=lambda r: r['start_s'])
+
+    def write_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump({'stages': self.trace()}, f, indent=2)
+
+    # indented, flame-style text table: nested stages under their parent, with
+    # self time (time not spent in child stages) and a bar scaled to total time
+    def summary(self, width=30):
+        records = self.trace()
+        if not records:
+            return 'no profiled stages'
+        child_wall = {}
+        for r in records:
+            parent_path = r['path'].rpartition(';')[0]
+            if parent_path:
+                child_wall[parent_path] = child_wall.get(parent_path, 0.0) + r['wall_s']
+        total = sum(r['wall_s'] for r in records if r['depth'] == 0) or 1e-12
+
+        lines = ['%-36s %-9s %9s %9s %9s %9s %9s %9s  %s' % (
+            'stage', 'kind', 'wall s', 'self s', 'cpu s', 'rows in', 'rows out', 'peak MB', '')]
+        for r in records:
+            self_s = r['wall_s'] - child_wall.get(r['path'], 0.0)
+            bar = '#' * max(1, int(round(width * r['wall_s'] / total)))
+            peak = '' if r['peak_traced_mb'] is None else '%.1f' % r['peak_traced_mb']
+            lines.append('%-36s %-9s %9.3f %9.3f %9.3f %9s %9s %9s  %s' % (
+                ('  ' * r['depth'] + r['name'])[:36], r['kind'], r['wall_s'], self_s, r['cpu_s'],
+                '' if r['rows_in'] is None else r['rows_in'],
+                '' if r['rows_out'] is None else r['rows_out'],
+                peak, bar))
+        rss = peak_rss_mb()
+        if rss is not None:
+            lines.append('process peak RSS: %.1f MB' % rss)
+        return '\n'.join(lines)
+
+
+# module level profiler shared by the pipeline steps
+PROFILER = Profiler()
+
+
+def enable(trace_memory=True):
+    PROFILER.trace_memory = trace_memory
+    PROFILER.reset()
+    PROFILER.start()
+    return PROFILER
+
+
+def disable():
+    PROFILER.stop()
+
+
+def stage(name, kind='step', rows_in=None):
+    return PROFILER.stage(name, kind, rows_in)
+
+
+def profiled(kind='step', name=None):
+    return PROFILER.profiled(kind, name)
+
+
+def summary():
+    return PROFILER.summary()
+
+
+def write_trace(path):
+    PROFILER.write_trace(path)
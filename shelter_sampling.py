@@ -0,0 +1,199 @@
+# One-pass stratified sample of a streamed export, for previews and point-level plots.
+#
+# Every row gets a uniform random key, and each (Type, Outcome Type) stratum keeps
+# the `size` rows with the smallest keys, so each stratum holds a uniform sample of
+# the rows seen so far no matter how the file is chunked. sample() then spends a
+# fixed budget across strata (proportional or equal) and attaches a weight per row
+# (rows seen in the stratum / rows drawn from it), so weighted sums and means over
+# the sample estimate the full export without bias. That needs a row from every
+# stratum: each non-empty one gets at least one when n allows it, and otherwise
+# sample() warns and strata_table(reservoir, sample) shows the rows left out.
+#   reservoir = stream_sample('sonoma-shelter-17-march-2025.csv', size=2000, seed=0)
+#   reservoir.sample(5)                          # instead of df.sample(5)
+#   plot_stay_vs_age(reservoir.sample(allocation='equal'))
+#   weighted_mean(reservoir.sample(), 'Days in Shelter', by='Type')
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from shelter_pipeline import add_age_columns
+from shelter_profiling import profiled
+from shelter_sketches import MISSING
+
+STRATA = ('Type', 'Outcome Type')
+
+
+class StratifiedReservoir:
+    def __init__(self, size=2000, by=STRATA, seed=0):
+        self.size = size
+        self.by = list(by)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.seen = pd.Series(dtype=np.int64)
+
+    def _strata(self, chunk):
+        labels = chunk[self.by].astype(object).fillna(MISSING)
+        return pd.MultiIndex.from_frame(labels).to_flat_index()
+
+    # keeps the `size` smallest keys of every stratum
+    def _trim(self, rows):
+        rows = rows.sort_values('_key', kind='stable')
+        return rows[rows.groupby('_stratum', sort=False).cumcount().to_numpy() < self.size]
+
+    def update(self, chunk):
+        strata = self._strata(chunk)
+        # keys are drawn in row order, so the sample doesn't depend on the chunk size
+        candidates = chunk.assign(_key=self.rng.random(len(chunk)), _stratum=strata)
+        if self.rows is not None:
+            candidates = pd.concat([self.rows, candidates])
+        self.rows = self._trim(candidates)
+        self.seen = self.seen.add(pd.Series(strata).value_counts(), fill_value=0).astype(np.int64)
+        return self
+
+    # reservoirs built from different parts of one export (different seeds) combine
+    # into the reservoir of the whole export
+    def merge(self, other):
+        if other.rows is not None:
+            rows = other.rows if self.rows is None else pd.concat([self.rows, other.rows])
+            self.rows = self._trim(rows)
+        self.seen = self.seen.add(other.seen, fill_value=0).astype(np.int64)
+        return self
+
+    # rows to draw per stratum: a share of n by stratum size ('proportional') or the
+    # same for every stratum ('equal'), never more than the stratum holds. Every
+    # non-empty stratum gets at least one row when n allows it, so none drops out of
+    # the weighted estimates.
+    def allocate(self, n, allocation='proportional'):
+        available = self.rows['_stratum'].value_counts().reindex(self.seen.index, fill_value=0)
+        if allocation == 'proportional':
+            share = self.seen.astype(float)
+        elif allocation == 'equal':
+            share = pd.Series(1.0, index=self.seen.index)
+        else:
+            raise ValueError("allocation must be 'proportional' or 'equal'")
+
+        n = min(n, int(available.sum()))
+        base = (available > 0).astype(np.int64)
+        if n < base.sum():
+            base[:] = 0
+        return base + _spread(share, available - base, n - int(base.sum()))
+
+    # n rows (default `size`) with a 'weight' column; rows come in random order
+    @profiled('sample')
+    def sample(self, n=None, allocation='proportional'):
+        if self.rows is None:
+            raise ValueError('no rows have been added')
+        counts = self.allocate(self.size if n is None else n, allocation)
+        missing = self.seen[counts == 0]
+        if missing.sum() > 0:
+            warnings.warn('%d rows drawn for %d strata: %d rows in %d strata have no weight '
+                          '(see strata_table)' % (counts.sum(), len(counts), missing.sum(), len(missing)))
+        rank = self.rows.groupby('_stratum', sort=False).cumcount().to_numpy()
+        taken = self.rows[rank < counts.reindex(self.rows['_stratum']).to_numpy()]
+        weights = (self.seen / counts.where(counts > 0)).reindex(taken['_stratum']).to_numpy()
+        return taken.drop(columns=['_key', '_stratum']).assign(weight=weights)
+
+
+# n rows spread over strata by share, capped at what each stratum has left
+def _spread(share, available, n):
+    quota = pd.Series(0.0, index=share.index)
+    open_strata = available > 0
+    remaining = n
+    while remaining > 1e-9 and open_strata.any():
+        wanted = share[open_strata] / share[open_strata].sum() * remaining
+        full = wanted >= available[open_strata] - quota[open_strata]
+        if not full.any():
+            quota[open_strata] += wanted
+            break
+        # strata too small for their share give all their rows, the rest is spread again
+        full = full[full].index
+        remaining -= float((available[full] - quota[full]).sum())
+        quota[full] = available[full]
+        open_strata[full] = False
+
+    # largest remainder rounding keeps the total at n
+    counts = np.floor(quota + 1e-9).astype(np.int64)
+    leftover = n - int(counts.sum())
+    if leftover > 0:
+        order = (quota - counts).where(counts < available, -1).sort_values(ascending=False, kind='stable')
+        counts[order.index[:leftover]] += 1
+    return counts
+
+
+# rows seen per stratum and rows drawn per stratum for a sample; 'missing' is the
+# rows of strata the sample has none of, which its weights don't account for
+def strata_table(reservoir, sample=None):
+    table = pd.DataFrame({'seen': reservoir.seen})
+    table.index = pd.MultiIndex.from_tuples(table.index, names=reservoir.by)
+    if sample is not None:
+        drawn = sample.groupby(reservoir.by, dropna=False).size()
+        drawn.index = pd.MultiIndex.from_frame(drawn.index.to_frame().astype(object).fillna(MISSING))
+        table['drawn'] = drawn.reindex(table.index, fill_value=0)
+        table['missing'] = table['seen'].where(table['drawn'] == 0, 0)
+    return table.sort_index()
+
+
+# weighted mean of a column, ignoring missing values; estimates the export-wide mean
+def weighted_mean(sample, column, by=None):
+    values = pd.to_numeric(sample[column], errors='coerce')
+    weights = sample['weight'].where(values.notna(), 0.0)
+    weighted = weights * values.fillna(0.0)
+    if by is None:
+        return weighted.sum() / weights.sum()
+    groups = sample[by]
+    return weighted.groupby(groups).sum() / weights.groupby(groups).sum()
+
+
+# estimated number of export rows per group
+def estimated_counts(sample, by):
+    return sample.groupby(by)['weight'].sum()
+
+
+@profiled('load')
+def stream_sample(source, size=2000, by=STRATA, seed=0, chunksize=100_000):
+    reservoir = StratifiedReservoir(size, by, seed)
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        reservoir.update(chunk)
+    return reservoir
+
+
+# Days in Shelter vs Age for a sample, one colour per Type
+@profiled('plot')
+def plot_stay_vs_age(sample, current_date=None):
+    import matplotlib.pyplot as plt
+
+    if 'Age' not in sample.columns:
+        sample = add_age_columns(sample.copy(), current_date)
+    fig, ax = plt.subplots()
+    for animal_type, group in sample.groupby('Type'):
+        ax.scatter(group['Age'], group['Days in Shelter'], s=8, alpha=0.4, label=animal_type)
+    ax.set_xlabel('age (years)')
+    ax.set_ylabel('days in shelter')
+    ax.set_title('Days in Shelter vs Age (n=%d sampled rows)' % len(sample))
+    ax.legend()
+    return ax
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stratified sample of a shelter export')
+    parser.add_argument('source', help='csv path or url')
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--allocation', choices=['proportional', 'equal'], default='proportional')
+    parser.add_argument('--plot', metavar='PNG', help='save a Days in Shelter vs Age scatter of the sample')
+    args = parser.parse_args()
+
+    reservoir = stream_sample(args.source, args.size, seed=args.seed)
+    sample = reservoir.sample(allocation=args.allocation)
+    print(strata_table(reservoir, sample).to_string())
+    print(weighted_mean(sample, 'Days in Shelter', by='Type'))
+    if args.plot:
+        import matplotlib
+        matplotlib.use('Agg')
+
+        plot_stay_vs_age(sample).figure.savefig(args.plot)
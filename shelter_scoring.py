@@ -0,0 +1,173 @@
+# Scores newly admitted animals with a trained stay model and outcome model.
+#
+# The artifact (one pickle holding both models) is loaded once. Each batch is
+# factorized per raw column, and the design column of every distinct raw value is
+# cached across batches, so a batch costs a few array gathers plus work on values
+# not seen before.
+#   python shelter_scoring.py train export.csv model.pkl
+#   python shelter_scoring.py score model.pkl intakes.csv > scores.csv
+#   cat intakes.csv | python shelter_scoring.py score model.pkl - > scores.csv
+#   python shelter_scoring.py benchmark
+
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from shelter_model import (MODEL_FEATURES, VALUE_FEATURES, build_vocab, date_features, fit_model,
+                           fit_outcome_model, model_features)
+from shelter_profiling import profiled
+
+# raw columns the features need, everything else in the file is skipped when reading
+INPUT_COLUMNS = sorted({raw for raw, _ in VALUE_FEATURES.values()} | {'Date Of Birth', 'Intake Date'})
+ID_COLUMN = 'Animal ID'
+
+
+@profiled('model')
+def train_artifact(df, path, alpha=1.0, min_count=5):
+    vocab = build_vocab(model_features(df), min_count)
+    artifact = {
+        'stay': fit_model(df, 'poisson', alpha, min_count, vocab=vocab),
+        'outcome': fit_outcome_model(df, alpha, min_count, vocab=vocab),
+    }
+    with open(path, 'wb') as f:
+        pickle.dump(artifact, f)
+    return artifact
+
+
+class Scorer:
+    def __init__(self, artifact):
+        if isinstance(artifact, str):
+            with open(artifact, 'rb') as f:
+                artifact = pickle.load(f)
+        self.stay_model = artifact['stay']
+        self.outcome_model = artifact['outcome']
+        self.outcomes = self.outcome_model['outcomes']
+        # both models share the vocab, so one design index per row serves both
+        self.vocab = self.outcome_model['vocab']
+        self.stay_coef = self.stay_model['coef']
+        self.outcome_coef = self.outcome_model['coef']
+        if self.stay_model['vocab'] != self.vocab:
+            raise ValueError('stay and outcome models were trained with different vocabularies')
+
+        self.offsets = {}
+        self.levels = {}
+        offset = 1
+        for column in MODEL_FEATURES:
+            self.offsets[column] = offset
+            self.levels[column] = pd.Index(self.vocab[column][1:])
+            offset += len(self.vocab[column])
+        # raw value -> design column, per feature
+        self.cache = {column: {} for column in VALUE_FEATURES}
+
+    def _value_columns(self, column, raw):
+        _, func = VALUE_FEATURES[column]
+        codes, uniques = pd.factorize(raw, use_na_sentinel=False)
+        cache = self.cache[column]
+        missing = [value for value in uniques if value not in cache]
+        if missing:
+            found = self.levels[column].get_indexer([func(value) for value in missing]) + 1
+            for value, index in zip(missing, found):
+                cache[value] = self.offsets[column] + index
+        table = np.array([cache[value] for value in uniques], dtype=np.int64)
+        return table[codes]
+
+    # design column of every nonzero, one row per animal (intercept column first)
+    def design_indices(self, df):
+        indices = np.empty((len(df), len(MODEL_FEATURES) + 1), dtype=np.int64)
+        indices[:, 0] = 0
+        dates = date_features(df)
+        for j, column in enumerate(MODEL_FEATURES, start=1):
+            if column in VALUE_FEATURES:
+                indices[:, j] = self._value_columns(column, df[VALUE_FEATURES[column][0]])
+            else:
+                indices[:, j] = self.levels[column].get_indexer(dates[column]) + 1 + self.offsets[column]
+        return indices
+
+    # predicted stay in days and a probability per outcome for every row
+    def score(self, df):
+        indices = self.design_indices(df)
+        # one nonzero per feature, so X @ coef is a sum of gathered coefficients
+        eta = self.stay_coef[indices].sum(axis=1)
+        logits = self.outcome_coef[indices].sum(axis=1)
+        logits -= logits.max(axis=1, keepdims=True)
+        p = np.exp(logits)
+        p /= p.sum(axis=1, keepdims=True)
+
+        scores = pd.DataFrame(p, columns=['p_' + outcome for outcome in self.outcomes], index=df.index)
+        scores.insert(0, 'predicted_stay', np.exp(eta))
+        scores.insert(1, 'predicted_outcome', np.array(self.outcomes, dtype=object)[p.argmax(axis=1)])
+        if ID_COLUMN in df.columns:
+            scores.insert(0, ID_COLUMN, df[ID_COLUMN].to_numpy())
+        return scores
+
+    # scores a csv path (or '-' for stdin) in batches, yielding one score frame per batch
+    def score_csv(self, source, batch_size=100_000):
+        if source == '-':
+            source = sys.stdin
+        reader = pd.read_csv(source, chunksize=batch_size,
+                             usecols=lambda column: column in INPUT_COLUMNS or column == ID_COLUMN)
+        for batch in reader:
+            yield self.score(batch)
+
+
+# rows per second for scoring in memory and from a csv file, on synthetic data
+def benchmark(train_rows=200_000, score_rows=1_000_000, batch_size=100_000):
+    import os
+    import tempfile
+
+    from shelter_synthetic import make_shelter_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact_path = os.path.join(tmp, 'model.pkl')
+        train_artifact(make_shelter_data(train_rows, seed=1), artifact_path)
+
+        start = time.perf_counter()
+        scorer = Scorer(artifact_path)
+        print('load artifact: %.3f s' % (time.perf_counter() - start))
+
+        intakes = make_shelter_data(score_rows, seed=2)
+        batches = [intakes.iloc[i:i + batch_size] for i in range(0, score_rows, batch_size)]
+        scorer.score(batches[0])  # warm the value cache like a long running scorer would
+        start = time.perf_counter()
+        for batch in batches:
+            scorer.score(batch)
+        elapsed = time.perf_counter() - start
+        print('in memory: %d rows in %.2f s = %.0f rows/s' % (score_rows, elapsed, score_rows / elapsed))
+
+        csv_path = os.path.join(tmp, 'intakes.csv')
+        intakes.to_csv(csv_path, index=False)
+        start = time.perf_counter()
+        rows = sum(len(scores) for scores in scorer.score_csv(csv_path, batch_size))
+        elapsed = time.perf_counter() - start
+        print('from csv:  %d rows in %.2f s = %.0f rows/s' % (rows, elapsed, rows / elapsed))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Train or run the intake scoring models')
+    commands = parser.add_subparsers(dest='command', required=True)
+    train = commands.add_parser('train', help='fit the stay and outcome models on an export')
+    train.add_argument('source', help='csv path or url')
+    train.add_argument('artifact', help='where to write the model pickle')
+    train.add_argument('--alpha', type=float, default=1.0)
+    score = commands.add_parser('score', help='score intake records, writes csv to stdout')
+    score.add_argument('artifact')
+    score.add_argument('source', nargs='?', default='-', help="csv path, or '-' for stdin")
+    score.add_argument('--batch-size', type=int, default=100_000)
+    bench = commands.add_parser('benchmark', help='time scoring on synthetic intakes')
+    bench.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train_artifact(pd.read_csv(args.source), args.artifact, args.alpha)
+    elif args.command == 'score':
+        header = True
+        for scores in Scorer(args.artifact).score_csv(args.source, args.batch_size):
+            scores.to_csv(sys.stdout, index=False, header=header)
+            header = False
+    else:
+        benchmark(score_rows=args.rows)
@@ -0,0 +1,175 @@
+# Bounded-memory "most common breeds/colors/names" counting for streamed exports.
+#
+# SpaceSaving keeps at most `capacity` candidate items. Every estimate is an upper
+# bound on the true count and over-counts by at most `error` (and never by more than
+# total / capacity). Summaries from different chunks or workers merge into one with
+# the same guarantee. CountMinSketch answers point queries for any item in a fixed
+# width x depth table and also merges by adding tables.
+#   top = TypeTopK(k=10)
+#   for chunk in pd.read_csv(path, chunksize=100_000):
+#       top.update(chunk)
+#   most_common_dog_breeds = top.top('DOG', 'PrimaryBreed').index.tolist()
+
+import numpy as np
+import pandas as pd
+
+from shelter_pipeline import add_breed_columns, add_color_columns
+
+MISSING = '(missing)'
+
+
+class SpaceSaving:
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=float)
+        self.errors = pd.Series(dtype=float)
+        self.total = 0.0
+
+    # an item we don't track may have been seen up to this many times
+    def floor(self):
+        if len(self.counts) < self.capacity:
+            return 0.0
+        return float(self.counts.min())
+
+    def _merge(self, counts, errors, other_floor, other_total):
+        index = self.counts.index.union(counts.index)
+        own_floor = self.floor()
+        merged = self.counts.reindex(index).fillna(own_floor) + counts.reindex(index).fillna(other_floor)
+        merged_errors = self.errors.reindex(index).fillna(own_floor) + errors.reindex(index).fillna(other_floor)
+        keep = merged.nlargest(self.capacity, keep='first').index
+        # anything dropped here is at most the smallest kept count, which floor() reports
+        self.counts = merged[keep]
+        self.errors = merged_errors[keep]
+        self.total += other_total
+
+    # values is any array-like of hashable items; NaN counts as MISSING
+    def update(self, values, weights=None):
+        values = pd.Series(values).fillna(MISSING)
+        if weights is None:
+            counts = values.value_counts().astype(float)
+        else:
+            counts = pd.Series(np.asarray(weights, dtype=float), index=values.to_numpy()).groupby(level=0).sum()
+        self.update_counts(counts)
+
+    # counts is an exact value -> count series, e.g. a chunk's value_counts()
+    def update_counts(self, counts):
+        counts = counts.astype(float)
+        self._merge(counts, pd.Series(0.0, index=counts.index), 0.0, float(counts.sum()))
+
+    def merge(self, other):
+        self._merge(other.counts, other.errors, other.floor(), other.total)
+        return self
+
+    # n largest estimates with their error bounds; 'guaranteed' items are certain to
+    # be in the true top n
+    def top(self, n=10):
+        counts = self.counts.sort_values(ascending=False, kind='stable')
+        top = pd.DataFrame({'count': counts, 'error': self.errors[counts.index]}).head(n)
+        threshold = counts.iloc[n] if len(counts) > n else self.floor()
+        top['guaranteed'] = top['count'] - top['error'] >= threshold
+        return top
+
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=5, seed=0):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # odd multipliers for multiply-shift hashing of the 64 bit item hashes
+        self.multipliers = rng.integers(1, 2**63, depth, dtype=np.uint64) | np.uint64(1)
+        self.offsets = rng.integers(0, 2**63, depth, dtype=np.uint64)
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _buckets(self, values):
+        hashed = pd.util.hash_array(np.asarray(pd.Series(values).fillna(MISSING), dtype=object))
+        with np.errstate(over='ignore'):
+            mixed = hashed[None, :] * self.multipliers[:, None] + self.offsets[:, None]
+        return ((mixed >> np.uint64(32)) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, values, counts=None):
+        if counts is None:
+            values = pd.Series(values).fillna(MISSING).value_counts()
+            values, counts = values.index.to_numpy(), values.to_numpy()
+        buckets = self._buckets(values)
+        counts = np.asarray(counts, dtype=np.int64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], buckets[row], counts)
+        self.total += int(counts.sum())
+
+    # upper bound on each item's count; over-counts by at most e * total / width with
+    # probability 1 - exp(-depth)
+    def estimate(self, values):
+        buckets = self._buckets(values)
+        return self.table[np.arange(self.depth)[:, None], buckets].min(axis=0)
+
+    def merge(self, other):
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError('can only merge sketches with the same width, depth and seed')
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+# a SpaceSaving summary and a CountMinSketch per (Type, column)
+class TypeTopK:
+    def __init__(self, columns=('PrimaryBreed', 'PrimaryBreedMix', 'Primary Color', 'Name'), k=10,
+                 capacity=200, width=2048, depth=5):
+        self.columns = list(columns)
+        self.k = k
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.summaries = {}
+        self.sketches = {}
+
+    def _summary(self, animal_type, column):
+        key = (animal_type, column)
+        if key not in self.summaries:
+            self.summaries[key] = SpaceSaving(self.capacity)
+            self.sketches[key] = CountMinSketch(self.width, self.depth)
+        return self.summaries[key], self.sketches[key]
+
+    # raw export chunk; derived breed/color columns are added if missing
+    def update(self, chunk):
+        if 'PrimaryBreed' in self.columns and 'PrimaryBreed' not in chunk.columns:
+            chunk = add_breed_columns(chunk.copy())
+        if 'Primary Color' in self.columns and 'Primary Color' not in chunk.columns:
+            chunk = add_color_columns(chunk.copy())
+        types = chunk['Type'].fillna(MISSING)
+        for column in self.columns:
+            # missing values are left out, like value_counts()
+            grouped = chunk[column].groupby(types).value_counts()
+            for animal_type, counts in grouped.groupby(level=0):
+                counts = counts.droplevel(0)
+                summary, sketch = self._summary(animal_type, column)
+                summary.update_counts(counts)
+                sketch.update(counts.index.to_numpy(), counts.to_numpy())
+        return self
+
+    def merge(self, other):
+        for (animal_type, column), summary in other.summaries.items():
+            own_summary, own_sketch = self._summary(animal_type, column)
+            own_summary.merge(summary)
+            own_sketch.merge(other.sketches[(animal_type, column)])
+        return self
+
+    # counts of the n most common values, shaped like value_counts().head(n)
+    def top(self, animal_type, column, n=None):
+        summary, _ = self._summary(animal_type, column)
+        return summary.top(n or self.k)['count'].astype(int).rename('count')
+
+    def top_table(self, animal_type, column, n=None):
+        return self._summary(animal_type, column)[0].top(n or self.k)
+
+    def estimate(self, animal_type, column, values):
+        return self._summary(animal_type, column)[1].estimate(values)
+
+
+# top-k summaries from a csv read in chunks
+def stream_top_k(source, chunksize=100_000, **kwargs):
+    top = TypeTopK(**kwargs)
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        top.update(chunk)
+    return top
@@ -0,0 +1,126 @@
+# Keeps every dated shelter export as a partition of one Hive-style Parquet dataset:
+#   shelter_store/snapshot_date=2025-03-17/Type=DOG/part-0.parquet
+#
+# Queries only read the partitions and columns they need, so comparing findings
+# across exports doesn't mean loading every CSV again:
+#   add_snapshot('sonoma-shelter-17-march-2025.csv')
+#   adoption_stays_by_year('DOG')
+
+import os
+import re
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from shelter_profiling import profiled
+from shelter_validation import DATE_FORMAT, parse_dates
+
+STORE_DIR = 'shelter_store'
+PARTITION_COLUMNS = ['snapshot_date', 'Type']
+DATE_COLUMNS = ['Date Of Birth', 'Intake Date', 'Outcome Date']
+NUMERIC_COLUMNS = ['Days in Shelter', 'Count']
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('snapshot_date', pa.string()), ('Type', pa.string())]), flavor='hive')
+
+
+# '...sonoma-shelter-17-march-2025.csv' -> '2025-03-17'
+def snapshot_date_from_name(name):
+    match = re.search(r'(\d{1,2})-([a-z]+)-(\d{4})', str(name).lower())
+    if match is None:
+        raise ValueError('no snapshot date in %r, pass snapshot_date explicitly' % (name,))
+    return datetime.strptime('-'.join(match.groups()), '%d-%B-%Y').strftime('%Y-%m-%d')
+
+
+# same column types for every export so partitions written from different CSVs line up
+def to_store_table(df, snapshot_date):
+    df = df.copy()
+    for column in df.columns:
+        if column in DATE_COLUMNS:
+            df[column] = parse_dates(df[column]).dt.date
+        elif column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        else:
+            df[column] = df[column].astype('string')
+    df['snapshot_date'] = snapshot_date
+    df['Type'] = df['Type'].fillna('UNKNOWN')
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+# adds (or replaces) one export as a snapshot partition. A replaced snapshot's
+# partitions are all removed first: write_dataset only replaces the Type partitions
+# the new export has, and a Type it lacks would keep its old rows.
+@profiled('load')
+def add_snapshot(source, snapshot_date=None, store_dir=STORE_DIR):
+    if snapshot_date is None:
+        snapshot_date = snapshot_date_from_name(source)
+    df = pd.read_csv(source)
+    shutil.rmtree(os.path.join(store_dir, 'snapshot_date=%s' % snapshot_date), ignore_errors=True)
+    ds.write_dataset(
+        to_store_table(df, snapshot_date), store_dir,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+    )
+    return snapshot_date
+
+
+def open_store(store_dir=STORE_DIR):
+    return ds.dataset(store_dir, format='parquet', partitioning=PARTITIONING)
+
+
+def snapshots(store_dir=STORE_DIR):
+    dates = set()
+    for fragment in open_store(store_dir).get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        dates.add(keys['snapshot_date'])
+    return sorted(dates)
+
+
+# reads only the requested columns from the partitions matching the filter.
+# filter is a pyarrow expression, e.g. ds.field('Type') == 'DOG'
+@profiled('load')
+def query(columns=None, filter=None, store_dir=STORE_DIR):
+    return open_store(store_dir).to_table(columns=columns, filter=filter).to_pandas()
+
+
+# one snapshot back in the export's own format (dates as MM/DD/YYYY strings),
+# ready for the shelter_pipeline steps
+def load_snapshot(snapshot_date, store_dir=STORE_DIR):
+    df = query(filter=ds.field('snapshot_date') == snapshot_date, store_dir=store_dir)
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column]).dt.strftime(DATE_FORMAT)
+    return df.drop(columns='snapshot_date')
+
+
+# average and median stay of adopted animals by intake year, for every snapshot
+def adoption_stays_by_year(animal_type='DOG', store_dir=STORE_DIR):
+    df = query(
+        columns=['snapshot_date', 'Intake Date', 'Days in Shelter'],
+        filter=(ds.field('Type') == animal_type) & (ds.field('Outcome Type') == 'ADOPTION'),
+        store_dir=store_dir,
+    )
+    df['year'] = pd.to_datetime(df['Intake Date']).dt.year
+    return (df.groupby(['snapshot_date', 'year'])['Days in Shelter']
+              .agg(['count', 'mean', 'median'])
+              .unstack('snapshot_date'))
+
+
+# average days of the most common breeds, one column per snapshot, to see how
+# the breed findings move between exports
+def breed_avg_days_by_snapshot(animal_type='DOG', n=10, store_dir=STORE_DIR):
+    from shelter_pipeline import get_primary_breed
+
+    df = query(columns=['snapshot_date', 'Breed', 'Days in Shelter'],
+               filter=ds.field('Type') == animal_type, store_dir=store_dir)
+    df['PrimaryBreed'] = df['Breed'].map(get_primary_breed)
+    most_common = df['PrimaryBreed'].value_counts().head(n).index
+    df = df[df['PrimaryBreed'].isin(most_common)]
+    return (df.groupby(['PrimaryBreed', 'snapshot_date'])['Days in Shelter'].mean()
+              .unstack('snapshot_date')
+              .reindex(most_common))
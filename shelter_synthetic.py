@@ -0,0 +1,115 @@
+# Synthetic Sonoma-style exports for trying the helper modules at sizes the real
+# export (~30,000 rows) doesn't reach.
+#
+# Columns, spellings and date formats follow the real export. Stays carry rough
+# versions of the notebook's findings (mixes and pit bulls stay longer, returns to
+# owner are quick, older animals leave sooner) so models have something to find.
+#   df = make_shelter_data(2_000_000)
+#   python shelter_synthetic.py 2000000 synthetic.csv
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+DOG_BREEDS = ['PIT BULL', 'PIT BULL/MIX', 'CHIHUAHUA SH', 'CHIHUAHUA SH/MIX', 'LABRADOR RETR',
+              'LABRADOR RETR/MIX', 'GERM SHEPHERD', 'GERM SHEPHERD/MIX', 'POODLE MIN', 'AUST CATTLE DOG',
+              'ROTTWEILER', 'BORDER COLLIE/MIX', 'BEAGLE', 'SIBERIAN HUSKY', 'BOXER/MIX']
+CAT_BREEDS = ['DOMESTIC SH', 'DOMESTIC MH', 'DOMESTIC LH', 'DOMESTIC SH/MIX', 'SIAMESE', 'PERSIAN',
+              'MANX', 'HIMALAYAN']
+OTHER_BREEDS = ['RABBIT SH', 'CHICKEN', 'GUINEA PIG', 'RAT']
+COLORS = ['BLACK', 'BLACK/WHITE', 'BROWN', 'BROWN TABBY', 'BRINDLE/WHITE', 'TAN', 'TAN/WHITE', 'WHITE',
+          'WHITE/CREAM', 'GRAY TABBY/WHITE', 'ORG TABBY', 'BLUE', 'CALICO', 'SEAL PT', 'GOLD', 'RED/WHITE']
+SEXES = ['Male', 'Female', 'Neutered', 'Spayed', 'Unknown']
+OUTCOMES = ['ADOPTION', 'RETURN TO OWNER', 'TRANSFER', 'EUTHANIZE', 'DIED']
+OUTCOME_P = [0.35, 0.30, 0.17, 0.13, 0.05]
+# multiplier on the base stay for each outcome
+OUTCOME_STAY = {'ADOPTION': 2.5, 'RETURN TO OWNER': 0.3, 'TRANSFER': 1.0, 'EUTHANIZE': 0.8, 'DIED': 0.6}
+
+
+# formats integer day offsets from start as MM/DD/YYYY, formatting each distinct day once
+def format_days(offsets, start):
+    days, inverse = np.unique(offsets, return_inverse=True)
+    table = (pd.Timestamp(start) + pd.to_timedelta(days, unit='D')).strftime('%m/%d/%Y')
+    return table.to_numpy(dtype=object)[inverse]
+
+
+# 'A000042' style ids, formatting each distinct number once
+def format_ids(prefix, numbers, width):
+    values, inverse = np.unique(numbers, return_inverse=True)
+    table = np.array(['%s%0*d' % (prefix, width, v) for v in values], dtype=object)
+    return table[inverse]
+
+
+def make_shelter_data(n, seed=0, start='2013-08-01', days=4200, animals=None):
+    rng = np.random.default_rng(seed)
+    types = rng.choice(['DOG', 'CAT', 'OTHER'], n, p=[0.5, 0.4, 0.1])
+    is_dog = types == 'DOG'
+    is_cat = types == 'CAT'
+
+    breed = np.where(is_dog, rng.choice(DOG_BREEDS, n),
+                     np.where(is_cat, rng.choice(CAT_BREEDS, n), rng.choice(OTHER_BREEDS, n)))
+    size = np.where(is_cat, rng.choice(['KITTEN', 'SMALL', 'MED'], n, p=[0.4, 0.3, 0.3]),
+                    rng.choice(['PUPPY', 'TOY', 'SMALL', 'MED', 'LARGE', 'X-LRG'], n,
+                               p=[0.15, 0.1, 0.25, 0.25, 0.2, 0.05]))
+    sex = rng.choice(SEXES, n, p=[0.25, 0.25, 0.22, 0.22, 0.06])
+    outcome_type = rng.choice(OUTCOMES, n, p=OUTCOME_P)
+
+    intake_day = np.sort(rng.integers(0, days, n))
+    age_days = rng.gamma(1.2, 900, n).astype(int)
+    age_days[(size == 'KITTEN') | (size == 'PUPPY')] //= 8
+
+    # base stay with the notebook's patterns, then geometric noise around it
+    mean_stay = np.full(n, 12.0)
+    for outcome, factor in OUTCOME_STAY.items():
+        mean_stay[outcome_type == outcome] *= factor
+    mean_stay[np.isin(breed, [b for b in DOG_BREEDS + CAT_BREEDS if 'MIX' in b])] *= 1.4
+    mean_stay[np.isin(breed, [b for b in DOG_BREEDS if b.startswith('PIT BULL')])] *= 1.6
+    mean_stay[is_cat] *= 1.2
+    mean_stay *= np.exp(-0.05 * age_days / 365)
+    mean_stay[np.isin(sex, ['Female', 'Spayed'])] *= 1.08
+    stay = rng.geometric(1 / (1 + mean_stay)) - 1
+
+    dob_str = format_days(intake_day - age_days, start)
+    dob_str[rng.random(n) < 0.12] = np.nan
+    if animals is None:
+        animals = max(int(n * 0.7), 1)
+    names = np.array(['MAX', 'BELLA', 'LUNA', 'CHARLIE', '*DAISY', 'ROCKY', 'MILO', 'KITTY'], dtype=object)
+    name = names[rng.integers(0, len(names), n)]
+    name[rng.random(n) < 0.3] = np.nan
+
+    return pd.DataFrame({
+        'Name': name,
+        'Type': types,
+        'Breed': breed,
+        'Color': rng.choice(COLORS, n),
+        'Sex': sex,
+        'Size': size,
+        'Date Of Birth': dob_str,
+        'Impound Number': format_ids('K', np.arange(n), 7),
+        'Kennel Number': rng.choice(['DA01', 'DA12', 'CA03', 'FELV'], n),
+        'Animal ID': format_ids('A', rng.integers(0, animals, n), 6),
+        'Intake Date': format_days(intake_day, start),
+        'Outcome Date': format_days(intake_day + stay, start),
+        'Days in Shelter': stay,
+        'Intake Type': rng.choice(['STRAY', 'OWNER SURRENDER', 'CONFISCATE', 'TRANSFER'], n,
+                                  p=[0.6, 0.2, 0.15, 0.05]),
+        'Intake Subtype': rng.choice(['FIELD', 'OVER THE COUNTER'], n),
+        'Outcome Type': outcome_type,
+        'Outcome Subtype': rng.choice(['WALKIN', 'SCAS WEB', 'FIELD'], n),
+        'Intake Condition': rng.choice(['HEALTHY', 'TREATABLE/REHAB', 'TREATABLE/MANAGEABLE',
+                                        'UNTREATABLE'], n, p=[0.55, 0.2, 0.15, 0.1]),
+        'Outcome Condition': rng.choice(['HEALTHY', 'TREATABLE/REHAB', 'UNTREATABLE'], n),
+        'Intake Jurisdiction': rng.choice(['SANTA ROSA', 'COUNTY', 'WINDSOR'], n),
+        'Outcome Jurisdiction': rng.choice(['SANTA ROSA', 'COUNTY', 'WINDSOR'], n),
+        'Outcome Zip Code': rng.choice([95401, 95403, 95404, 95407, 95492], n),
+        'Location': '',
+        'Count': 1,
+    })
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    path = sys.argv[2] if len(sys.argv) > 2 else 'synthetic-shelter.csv'
+    make_shelter_data(rows).to_csv(path, index=False)
+    print('wrote %d rows to %s' % (rows, path))
@@ -0,0 +1,100 @@
+# Vectorized data-quality checks for a shelter export.
+#
+# Every rule is a boolean mask over the whole frame, computed from dates that are
+# parsed once. validate() returns a compact issue table plus a quarantine mask:
+#   issues, quarantine = validate(df)
+#   clean_df = df[~quarantine]
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from shelter_profiling import profiled
+
+DATE_FORMAT = '%m/%d/%Y'
+
+# category spellings seen in the Sonoma exports, anything else is flagged
+KNOWN_CATEGORIES = {
+    'Type': ['DOG', 'CAT', 'OTHER'],
+    'Sex': ['Male', 'Female', 'Neutered', 'Spayed', 'Unknown'],
+    'Size': ['TOY', 'SMALL', 'MED', 'LARGE', 'X-LRG', 'KITTEN', 'PUPPY'],
+    'Outcome Type': ['ADOPTION', 'RETURN TO OWNER', 'TRANSFER', 'EUTHANIZE', 'DIED',
+                     'ESCAPED', 'DISPOSAL', 'RTOS', 'VET'],
+}
+
+# rules whose rows should be left out of the analyses; unknown categories are only reported
+QUARANTINE_RULES = ['stay_mismatch', 'outcome_before_intake', 'dob_in_future', 'dob_after_intake',
+                    'bad_date']
+
+
+# parses each distinct date string once, exports only have a few thousand distinct dates
+def parse_dates(series):
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format=DATE_FORMAT, errors='coerce')
+    values = parsed.to_numpy(dtype='datetime64[ns]')
+    values = np.append(values, np.datetime64('NaT', 'ns'))[codes]  # code -1 (missing) -> NaT
+    return pd.Series(values, index=series.index)
+
+
+# length of stay from the two date columns, in whole days (NaN when either is missing)
+def length_of_stay(df):
+    return (parse_dates(df['Outcome Date']) - parse_dates(df['Intake Date'])).dt.days
+
+
+# one boolean column per rule, True where the row breaks the rule
+def rule_flags(df, current_date=None, categories=KNOWN_CATEGORIES):
+    if current_date is None:
+        current_date = datetime.today()
+    current_date = pd.Timestamp(current_date)
+
+    intake = parse_dates(df['Intake Date'])
+    outcome = parse_dates(df['Outcome Date'])
+    dob = parse_dates(df['Date Of Birth'])
+    stay = (outcome - intake).dt.days
+
+    flags = pd.DataFrame(index=df.index)
+    flags['stay_mismatch'] = stay.notna() & (stay != df['Days in Shelter'])
+    flags['outcome_before_intake'] = (outcome < intake).fillna(False)
+    flags['dob_in_future'] = (dob > current_date).fillna(False)
+    flags['dob_after_intake'] = (dob > intake).fillna(False)
+
+    # a value was there but could not be read as a date
+    bad_date = np.zeros(len(df), dtype=bool)
+    for column, parsed in (('Intake Date', intake), ('Outcome Date', outcome), ('Date Of Birth', dob)):
+        bad_date |= (df[column].notna() & parsed.isna()).to_numpy()
+    flags['bad_date'] = bad_date
+
+    for column, known in categories.items():
+        if column in df.columns:
+            flags['unknown_' + column] = df[column].notna() & ~df[column].isin(known)
+    return flags
+
+
+@profiled('validate')
+def validate(df, current_date=None, categories=KNOWN_CATEGORIES, quarantine_rules=QUARANTINE_RULES):
+    flags = rule_flags(df, current_date, categories)
+
+    counts = flags.sum()
+    issues = pd.DataFrame({
+        'rule': counts.index,
+        'rows': counts.values,
+        'pct': counts.values / max(len(df), 1) * 100,
+        'quarantined': [rule in quarantine_rules for rule in counts.index],
+    })
+    # a few example row labels for each rule to look at by hand
+    issues['examples'] = [flags.index[flags[rule].to_numpy()][:5].tolist() for rule in counts.index]
+    issues = issues[issues['rows'] > 0].sort_values('rows', ascending=False).reset_index(drop=True)
+
+    quarantine = flags[[rule for rule in quarantine_rules if rule in flags.columns]].any(axis=1)
+    return issues, quarantine
+
+
+# unknown category values and how often each one appears
+def unknown_values(df, categories=KNOWN_CATEGORIES):
+    rows = []
+    for column, known in categories.items():
+        if column in df.columns:
+            values = df.loc[df[column].notna() & ~df[column].isin(known), column].value_counts()
+            rows += [(column, value, count) for value, count in values.items()]
+    return pd.DataFrame(rows, columns=['column', 'value', 'rows'])
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from shelter_associations import rank_associations
+from shelter_synthetic import make_shelter_data
+
+
+def test_ranked_on_one_scale():
+    df = make_shelter_data(5000, seed=6)
+    table = rank_associations(df, current_date=datetime(2025, 3, 17), workers=1)
+    eta2 = table['effect_measure'] == 'eta2'
+    assert np.allclose(table.loc[eta2, 'effect_r'] ** 2, table.loc[eta2, 'effect_size'])
+    assert (table.loc[~eta2, 'effect_r'] == table.loc[~eta2, 'effect_size']).all()
+    for _, part in table.groupby('target'):
+        assert part['effect_r'].is_monotonic_decreasing
+
+
+def test_variance_share_not_ranked_below_correlation():
+    # a factor explaining ~1% of stay variance vs a numeric one with |rho| ~ 0.05
+    rng = np.random.default_rng(0)
+    n = 20000
+    group = rng.integers(0, 2, n)
+    age = rng.normal(size=n)
+    stay = rng.normal(size=n) + 0.2 * group + 0.05 * age
+    df = pd.DataFrame({'Days in Shelter': stay, 'Outcome Type': 'ADOPTION'})
+    factors = {'group': ('category', group), 'Age': ('numeric', age)}
+    table = rank_associations(df, factors, workers=1)
+    stay_rows = table[table['target'] == 'Days in Shelter']
+    assert stay_rows['factor'].tolist() == ['group', 'Age']
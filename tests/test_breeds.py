@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from shelter_breeds import BreedCanonicalizer, load_breed_map, save_breed_map
+
+MERGES = [
+    ('LABRADOR RETRIEVER', 'LABRADOR RETR'),
+    ('LABRADR RETR/MIX', 'LABRADOR RETR'),
+    ('GERMAN SHEPHERD', 'GERM SHEPHERD'),
+    ('GERM SHEPERD', 'GERM SHEPHERD'),
+    ('CHIHUAHUA SHORTHAIR', 'CHIHUAHUA SH'),
+    ('AUST CATTLE', 'AUST CATTLE DOG'),
+    ('AUSTRALIAN CATTLE DOG', 'AUST CATTLE DOG'),
+    ('PITBULL', 'PIT BULL'),
+    ('SIBERIAN HUSKEY', 'SIBERIAN HUSKY'),
+    ('YORKSHIRE TERRIER', 'YORKSHIRE TERR'),
+]
+
+NON_MERGES = [
+    ('BULLDOG', 'AMER BULLDOG'),
+    ('POODLE', 'POODLE STND'),
+    ('SHEPHERD', 'GERM SHEPHERD'),
+    ('CHIHUAHUA LH', 'CHIHUAHUA SH'),
+    ('DOMESTIC MH', 'DOMESTIC SH'),
+    ('RABBIT LH', 'RABBIT SH'),
+    ('POODLE MIN', 'POODLE TOY'),
+]
+
+
+@pytest.mark.parametrize('raw, canonical', MERGES)
+def test_variants_merge(raw, canonical):
+    breeds = BreedCanonicalizer().resolve([raw])
+    assert breeds.mapping[raw][0] == canonical
+
+
+@pytest.mark.parametrize('raw, other', NON_MERGES)
+def test_distinct_breeds_stay_apart(raw, other):
+    breeds = BreedCanonicalizer().resolve([raw])
+    assert breeds.mapping[raw][0] != other
+
+
+def test_longer_name_not_folded_into_shorter():
+    # ENG BULLDOG is more common, so it is a canonical name before OLDE ENG BULLDOG is resolved
+    breeds = BreedCanonicalizer().resolve(['ENG BULLDOG'] * 3 + ['OLDE ENG BULLDOG'])
+    assert breeds.mapping['ENG BULLDOG'][0] == 'ENG BULLDOG'
+    assert breeds.mapping['OLDE ENG BULLDOG'][0] == 'OLDE ENG BULLDOG'
+
+
+def test_map_round_trip(tmp_path):
+    path = str(tmp_path / 'breed_map.csv')
+    breeds = BreedCanonicalizer()
+    column = pd.Series(['LABRADOR RETRIEVER/MIX', 'LABRADR RETR', None, 'BULLDOG'])
+    first = breeds.canonicalize(column)
+    save_breed_map(breeds, path)
+    assert load_breed_map(path).canonicalize(column).equals(first)
+    assert first.tolist() == ['LABRADOR RETR', 'LABRADOR RETR', 'Unknown', 'BULLDOG']
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import numpy as np
+
+from shelter_capacity import simulate, stay_pools
+from shelter_pipeline import add_breed_columns
+from shelter_synthetic import make_shelter_data
+
+TODAY = datetime(2025, 3, 17)
+
+
+def history_with_bad_stays():
+    df = add_breed_columns(make_shelter_data(3000, seed=4))
+    finished = df.index[df['Days in Shelter'].notna() & df['Outcome Type'].notna()]
+    # a typo the dates contradict, and a negative stay with no dates to check it against
+    df.loc[finished[0], 'Days in Shelter'] = -400
+    df.loc[finished[1], ['Days in Shelter', 'Intake Date', 'Outcome Date']] = [-3, np.nan, np.nan]
+    return df, finished[:2]
+
+
+def test_pools_leave_out_negative_and_quarantined_stays():
+    df, bad = history_with_bad_stays()
+    pools = stay_pools(df, current_date=TODAY)
+    assert pools['stays'].min() >= 0
+    assert len(pools['stays']) == len(stay_pools(df.drop(bad), current_date=TODAY)['stays'])
+
+
+def test_simulate_with_bad_stays():
+    df, _ = history_with_bad_stays()
+    result = simulate(df, replicates=20, batch=7, current_date=TODAY)
+    assert result['samples'].min() >= 0
@@ -0,0 +1,51 @@
+import os
+
+from cell_cache import CellCache, assign_keys, parse_cells, run_notebook
+
+NOTEBOOK = """# %%
+data = {'a': 1}
+
+
+def helper(value):
+    return dict(value)
+
+# %%
+data['b'] = 2
+
+# %%
+result = helper(data)
+"""
+
+
+def _run(path, cache_dir):
+    return run_notebook(str(path), str(cache_dir), min_seconds=0, verbose=False)
+
+
+def test_rerun_producer_does_not_hide_later_mutation(tmp_path):
+    path = tmp_path / 'notebook.py'
+    cache_dir = tmp_path / 'cache'
+    path.write_text(NOTEBOOK)
+    namespace, _ = _run(path, cache_dir)
+    assert namespace['result'] == {'a': 1, 'b': 2}
+
+    # cell 2 changes; cell 0 re-runs for helper (a function isn't snapshotted) and
+    # rebinds data, cell 1 stays cached
+    path.write_text(NOTEBOOK.replace('result = helper(data)', 'result = helper(data)\ncount = len(result)'))
+    namespace, report = _run(path, cache_dir)
+    assert [status for _, status, _ in report] == ['ran', 'cached', 'ran']
+    assert namespace['result'] == {'a': 1, 'b': 2}
+    assert namespace['count'] == 2
+
+
+def test_stale_snapshots_pruned(tmp_path):
+    path = tmp_path / 'notebook.py'
+    cache_dir = tmp_path / 'cache'
+    for i in range(3):
+        path.write_text(NOTEBOOK.replace('result = helper(data)', 'result = helper(data)\nversion = %d' % i))
+        _run(path, cache_dir)
+    cells = parse_cells(str(path))
+    assign_keys(cells)
+    keys = {cell.key for cell in cells}
+    snapshots = {name[:-len('.pkl')] for name in os.listdir(cache_dir) if name.endswith('.pkl')}
+    assert snapshots and snapshots <= keys
+    assert set(CellCache(str(cache_dir)).index) == keys
@@ -0,0 +1,15 @@
+import numpy as np
+
+from shelter_cohorts import CohortMatrix
+from shelter_synthetic import make_shelter_data
+
+
+def test_rows_without_impound_number_are_counted_not_merged():
+    df = make_shelter_data(2000, seed=5)
+    df.loc[df.index[:30], 'Impound Number'] = np.nan
+    cohorts = CohortMatrix().update(df, as_of='2025-03-17')
+    keyed = CohortMatrix().update(df.iloc[30:], as_of='2025-03-17')
+    assert cohorts.unkeyed == 30
+    assert not cohorts.records.index.isna().any()
+    assert np.array_equal(cohorts.counts, keyed.counts)
+    assert cohorts.intakes().sum() == len(df) - 30 - df['Intake Date'].iloc[30:].isna().sum()
@@ -0,0 +1,17 @@
+import pandas as pd
+
+import shelter_profiling as prof
+from shelter_colors import ColorTokens
+
+
+def test_color_tokens_stage_reports_rows():
+    colors = pd.Series(['GRAY TABBY/WHITE', 'BLACK', None, 'ORG/WHITE'] * 25)
+    prof.enable(trace_memory=False)
+    try:
+        tokens = ColorTokens(colors)
+    finally:
+        prof.disable()
+    record, = [r for r in prof.PROFILER.trace() if r['name'] == 'ColorTokens']
+    assert record['kind'] == 'feature'
+    assert record['rows_in'] == record['rows_out'] == tokens.matrix.shape[0] == 100
+    assert list(tokens.vocab) == ['black', 'gray', 'orange', 'tabby', 'white']
@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from shelter_fetch import fetch_all, fetch_one, read_meta, write_meta
+
+NAME = 'sonoma-shelter-17-march-2025.csv'
+BODY = b''.join(b'row %06d,DOG,PIT BULL\n' % i for i in range(20000))
+
+
+# a stand-in for the export host: static files with ETag, conditional GET and Range
+# support, and every request's status recorded
+async def _serve(directory):
+    statuses = []
+
+    # static responses settle on 200/206/304/416 only when they are prepared
+    async def record(request, response):
+        statuses.append(response.status)
+
+    app = web.Application()
+    app.on_response_prepare.append(record)
+    app.router.add_static('/', directory)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, 'http://127.0.0.1:%d/' % port, statuses
+
+
+def _mirror(tmp_path, prepare=None, retries=3):
+    served = tmp_path / 'served'
+    served.mkdir(exist_ok=True)
+    (served / NAME).write_bytes(BODY)
+    mirror = str(tmp_path / 'mirror')
+    os.makedirs(mirror, exist_ok=True)
+
+    async def run():
+        runner, base_url, statuses = await _serve(str(served))
+        try:
+            if prepare:
+                await prepare(base_url, mirror)
+                statuses.clear()
+            async with aiohttp.ClientSession() as session:
+                result = await fetch_one(session, base_url + NAME, os.path.join(mirror, NAME), retries)
+        finally:
+            await runner.cleanup()
+        return result, statuses
+
+    return asyncio.run(run()), os.path.join(mirror, NAME)
+
+
+async def _download(base_url, mirror):
+    await fetch_all([NAME], mirror, base_url)
+
+
+# a .part holding the first bytes, with the validators of the served file
+def _partial(size):
+    async def prepare(base_url, mirror):
+        async with aiohttp.ClientSession() as session:
+            async with session.head(base_url + NAME) as response:
+                validators = {'etag': response.headers.get('ETag'),
+                              'last_modified': response.headers.get('Last-Modified')}
+        part = os.path.join(mirror, NAME + '.part')
+        with open(part, 'wb') as f:
+            f.write(BODY[:size])
+        write_meta(part + '.json', validators)
+    return prepare
+
+
+def test_download(tmp_path):
+    (result, statuses), path = _mirror(tmp_path)
+    assert result['status'] == 'downloaded' and statuses == [200]
+    assert open(path, 'rb').read() == BODY
+    assert read_meta(path + '.meta.json')['size'] == len(BODY)
+
+
+def test_not_modified(tmp_path):
+    (result, statuses), path = _mirror(tmp_path, _download)
+    assert result['status'] == 'not modified' and statuses == [304]
+    assert open(path, 'rb').read() == BODY
+
+
+def test_resume(tmp_path):
+    (result, statuses), path = _mirror(tmp_path, _partial(100_000))
+    assert result['status'] == 'resumed' and statuses == [206]
+    assert result['bytes'] == len(BODY) - 100_000
+    assert open(path, 'rb').read() == BODY
+    assert not os.path.exists(path + '.part')
+
+
+@pytest.mark.parametrize('retries', [0, 3])
+def test_complete_part_starts_over(tmp_path, retries):
+    # the .part already holds the whole file, so the Range request gets a 416
+    (result, statuses), path = _mirror(tmp_path, _partial(len(BODY)), retries)
+    assert statuses == [416, 200]
+    assert result['status'] == 'downloaded'
+    assert open(path, 'rb').read() == BODY
@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from shelter_linking import link_visits, select_visits
+from shelter_polars import first_visits, parse_date, scan
+
+EXPORT = """Animal ID,Intake Date,Outcome Date,Outcome Type,Days in Shelter
+A1,01/05/2024,01/10/2024,RETURN TO OWNER,5
+NA,01/06/2024,01/08/2024,ADOPTION,2
+A1,02/01/2024,02/03/2024,ADOPTION,2
+,01/07/2024,01/09/2024,TRANSFER,2
+NA,01/02/2024,01/04/2024,ADOPTION,2
+A2,01/03/2024,,,
+"""
+
+
+def test_missing_ids_are_separate_animals():
+    df = link_visits(pd.read_csv(io.StringIO(EXPORT)))
+    missing = df['Animal ID'].isna()
+    assert missing.sum() == 3
+    assert (df.loc[missing, 'visit_number'] == 1).all()
+    assert (df.loc[missing, 'visit_count'] == 1).all()
+    assert df.loc[missing, 'previous_outcome'].isna().all()
+    assert df['visit_number'].tolist() == [1, 1, 2, 1, 1, 1]
+    assert df.loc[2, 'previous_outcome'] == 'RETURN TO OWNER'
+    assert df.loc[2, 'days_since_last_outcome'] == 22
+
+
+def test_nan_ids_in_a_frame():
+    df = pd.DataFrame({
+        'Animal ID': ['A1', np.nan, 'A1', np.nan],
+        'Intake Date': ['01/01/2024', '01/02/2024', '01/03/2024', '01/04/2024'],
+        'Outcome Date': ['01/02/2024', '01/03/2024', '01/04/2024', '01/05/2024'],
+        'Outcome Type': ['ADOPTION'] * 4,
+    })
+    assert len(select_visits(link_visits(df), 'first')) == 3
+
+
+def test_first_visits_same_rows_in_both_engines(tmp_path):
+    path = tmp_path / 'export.csv'
+    path.write_text(EXPORT)
+    eager = select_visits(link_visits(pd.read_csv(path)), 'first')
+    lazy = first_visits(scan(str(path)).with_columns(_animal=pl.col('Animal ID'),
+                                                     _intake=parse_date('Intake Date'))).collect()
+    assert lazy['Intake Date'].to_list() == eager['Intake Date'].tolist()
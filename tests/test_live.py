@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from shelter_live import LiveAggregates, load_checkpoint, replay, run_live
+from shelter_pipeline import outcome_avg_days
+from shelter_synthetic import make_shelter_data
+
+
+def _append(path, events):
+    with open(path, 'a') as f:
+        f.writelines(json.dumps(event) + '\n' for event in events)
+
+
+def _summary(state):
+    return (state.outcome_avg_days(), state.sketches.top('DOG', 'Primary Color'),
+            state.intake_counts(('Type', 'PrimaryBreed')))
+
+
+def test_missing_name_and_color_through_checkpoint(tmp_path):
+    df = make_shelter_data(400, seed=1)
+    df['Name'] = np.nan
+    df.loc[df.index[::2], 'Color'] = np.nan
+    df.loc[df.index[:100], 'Color'] = np.nan
+    events = list(replay(df))
+    path = str(tmp_path / 'events.jsonl')
+    checkpoint = str(tmp_path / 'live.pkl')
+
+    # the first half, then the rest appended and picked up from the checkpoint
+    half = len(events) // 2
+    _append(path, events[:half])
+    run_live(path, LiveAggregates(sketch_batch=50), checkpoint=checkpoint, checkpoint_every=70)
+    assert load_checkpoint(checkpoint).events == half
+    _append(path, events[half:])
+    resumed = run_live(path, checkpoint=checkpoint)
+
+    whole = LiveAggregates(sketch_batch=50)
+    for event in events:
+        whole.handle(event)
+    whole.flush_sketches()
+
+    assert resumed.events == whole.events == len(events)
+    for got, expected in zip(_summary(resumed), _summary(whole)):
+        assert got.sort_index().equals(expected.sort_index())
+
+
+def test_replay_matches_batch_outcome_avg_days():
+    df = make_shelter_data(2000, seed=2)
+    state = LiveAggregates()
+    for event in replay(df):
+        state.handle(event)
+    state.flush_sketches()
+
+    expected = outcome_avg_days(df)
+    got = state.outcome_avg_days()
+    pd.testing.assert_series_equal(got.sort_index(), expected.sort_index(), check_names=False, rtol=1e-12)
+    assert state.events == len(df) + df['Outcome Date'].notna().sum()
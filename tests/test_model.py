@@ -0,0 +1,53 @@
+import numpy as np
+
+from shelter_model import build_vocab, collapse_rows, design_matrix, fit_log_stay, model_features
+from shelter_synthetic import make_shelter_data
+
+
+def _collapsed(n=3000):
+    df = make_shelter_data(n, seed=4)
+    features = model_features(df)
+    vocab = build_vocab(features)
+    X = design_matrix(features, vocab)
+    stay = df['Days in Shelter'].to_numpy(dtype=float)
+    return X, stay
+
+
+def test_log_stay_matches_normal_equations_with_free_intercept():
+    X, stay = _collapsed()
+    alpha = 5.0
+    beta = fit_log_stay(X, np.ones(len(stay)), np.log1p(stay), alpha)
+    dense = X.toarray()
+    penalty = np.full(X.shape[1], alpha)
+    penalty[0] = 0.0
+    expected = np.linalg.lstsq(dense.T @ dense + np.diag(penalty), dense.T @ np.log1p(stay), rcond=None)[0]
+    assert np.allclose(X @ beta, dense @ expected, atol=1e-6)
+
+
+def test_heavy_penalty_leaves_the_mean():
+    X, stay = _collapsed()
+    beta = fit_log_stay(X, np.ones(len(stay)), np.log1p(stay), alpha=1e9)
+    assert abs(beta[0] - np.log1p(stay).mean()) < 1e-4
+    assert np.abs(beta[1:]).max() < 1e-4
+
+
+def test_collapse_rows_without_key_overflow():
+    # 9 features of 256 levels: the first one's code is multiplied by 256 ** 8 = 2 ** 64 in
+    # a mixed-radix key, so rows differing only there would share a wrapped int64 key
+    width = 256
+    rows = np.zeros((4, 10), dtype=np.int64)
+    rows[:, 1:] = 1 + width * np.arange(9)
+    rows[1:, 1] += 1
+    rows[3, 2] += width - 1
+    rows[2, 3] += 1
+    indices = np.repeat(rows, [3, 2, 4, 1], axis=0)
+    indices[0, 1:] += width - 1   # every feature uses its full range
+    stay = np.arange(len(indices), dtype=float)
+
+    collapsed, weight, stay_sum, _ = collapse_rows(indices, stay)
+    unique, inverse = np.unique(indices, axis=0, return_inverse=True)
+    assert len(collapsed) == len(unique) == 5
+    order = np.lexsort(collapsed.T[::-1])
+    assert (collapsed[order] == unique).all()
+    assert (weight[order] == np.bincount(inverse.ravel())).all()
+    assert (stay_sum[order] == np.bincount(inverse.ravel(), weights=stay)).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from shelter_permutation import claim_tests, holm, pairwise_tests, permutation_test
+from shelter_synthetic import make_shelter_data
+
+
+def test_no_group_large_enough():
+    values = pd.Series([1.0, 2.0, 3.0, 4.0])
+    groups = pd.Series(['a', 'a', 'b', 'b'])
+    table = pairwise_tests(values, groups, min_count=30, n_permutations=100, workers=1)
+    assert table.empty and 'p_holm' in table.columns
+
+
+def test_claim_tests_sections_always_present():
+    df = make_shelter_data(200, seed=0)
+    tables = claim_tests(df, n_permutations=200, workers=1, min_count=10_000)
+    assert list(tables) == ['sex', 'type', 'dog breed', 'dog breed (mixes generalized)', 'cat breed', 'outcome']
+    assert all(table.empty for table in tables.values())
+
+    tables = claim_tests(df, n_permutations=200, workers=1, min_count=20)
+    assert len(tables['type']) == 1 and tables['type']['group_a'].iloc[0] == 'DOG'
+
+
+def test_shifted_means_detected():
+    rng = np.random.default_rng(0)
+    a = rng.poisson(12, 300)
+    b = rng.poisson(10, 300)
+    assert permutation_test(a, b, n_permutations=2000)['p_value'] < 0.01
+    assert permutation_test(a, a.copy(), n_permutations=2000)['p_value'] == 1.0
+
+
+def test_holm():
+    assert np.allclose(holm([0.01, 0.04, 0.03]), [0.03, 0.06, 0.06])
+    assert len(holm([])) == 0
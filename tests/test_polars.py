@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shelter_pipeline import run_pipeline
+from shelter_polars import check_parity, run_lazy
+from shelter_synthetic import make_shelter_data
+
+CURRENT_DATE = datetime(2025, 3, 17)
+
+
+# a synthetic export with repeat animals, missing ids and dates, and rows the
+# quarantine rules catch
+@pytest.fixture(scope='module')
+def export(tmp_path_factory):
+    df = make_shelter_data(3000, seed=3, animals=1500)
+    rng = np.random.default_rng(3)
+    for column, share in (('Animal ID', 0.05), ('Intake Date', 0.02), ('Outcome Date', 0.05),
+                          ('Date Of Birth', 0.05)):
+        df.loc[rng.random(len(df)) < share, column] = np.nan
+    df.loc[rng.random(len(df)) < 0.02, 'Days in Shelter'] += 3
+    df.loc[rng.random(len(df)) < 0.01, 'Intake Date'] = 'not a date'
+    path = tmp_path_factory.mktemp('polars') / 'export.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('visits', ['all', 'first'])
+@pytest.mark.parametrize('drop_quarantined', [True, False])
+def test_engines_agree(export, visits, drop_quarantined):
+    assert check_parity(export, CURRENT_DATE, drop_quarantined, visits)
+
+
+def test_engines_agree_on_a_frame(export):
+    df = pd.read_csv(export)
+    assert check_parity(df, CURRENT_DATE, visits='first')
+
+
+def test_same_shared_keys(export):
+    eager = run_pipeline(export, current_date=CURRENT_DATE)
+    lazy = run_pipeline(export, current_date=CURRENT_DATE, engine='polars')
+    assert set(lazy) == set(eager) - {'df', 'issues'}
+    assert lazy['quarantine'].sum() > 0
+    assert run_lazy(pd.read_csv(export), current_date=CURRENT_DATE)['quarantine'].equals(lazy['quarantine'])
@@ -0,0 +1,40 @@
+import warnings
+
+import pytest
+
+from shelter_sampling import StratifiedReservoir, strata_table
+from shelter_synthetic import make_shelter_data
+
+
+def reservoir(n=20000):
+    return StratifiedReservoir(size=200, seed=0).update(make_shelter_data(n, seed=3))
+
+
+def test_small_sample_covers_every_stratum():
+    res = reservoir()
+    n = len(res.seen)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        sample = res.sample(n)
+    assert len(sample) == n
+    assert sample['weight'].sum() == pytest.approx(res.seen.sum())
+    assert (strata_table(res, sample)['drawn'] == 1).all()
+
+
+def test_too_few_rows_warns_and_reports_missing():
+    res = reservoir()
+    with pytest.warns(UserWarning, match='no weight'):
+        sample = res.sample(5)
+    assert len(sample) == 5
+    table = strata_table(res, sample)
+    assert table['missing'].sum() > 0
+    assert sample['weight'].sum() + table['missing'].sum() == pytest.approx(res.seen.sum())
+
+
+def test_allocation_total():
+    res = reservoir()
+    for n in (len(res.seen), 100, 1000):
+        for allocation in ('proportional', 'equal'):
+            counts = res.allocate(n, allocation)
+            assert counts.sum() == n
+            assert (counts >= 1).all()
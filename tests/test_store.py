@@ -0,0 +1,23 @@
+from shelter_store import add_snapshot, load_snapshot, snapshots
+from shelter_synthetic import make_shelter_data
+
+
+def test_replacing_a_snapshot_drops_types_it_no_longer_has(tmp_path):
+    store = str(tmp_path / 'store')
+    df = make_shelter_data(500, seed=5)
+    full = tmp_path / 'sonoma-shelter-17-march-2025.csv'
+    df.to_csv(full, index=False)
+    other = tmp_path / 'sonoma-shelter-15-october-2024.csv'
+    df.to_csv(other, index=False)
+    add_snapshot(str(full), store_dir=store)
+    add_snapshot(str(other), store_dir=store)
+    assert set(load_snapshot('2025-03-17', store)['Type']) == set(df['Type'])
+
+    dogs = df[df['Type'] == 'DOG']
+    dogs.to_csv(full, index=False)
+    add_snapshot(str(full), store_dir=store)
+    replaced = load_snapshot('2025-03-17', store)
+    assert len(replaced) == len(dogs) and set(replaced['Type']) == {'DOG'}
+    # other snapshots are untouched
+    assert len(load_snapshot('2024-10-15', store)) == len(df)
+    assert list(snapshots(store)) == ['2024-10-15', '2025-03-17']